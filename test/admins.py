@@ -1,44 +1,92 @@
-
-import json
 import os
+import time
 import logging
+import threading
+from datetime import datetime
+from storage import JsonDocument
 
 ADMINS_JSON_PATH = "data/admins.json"
 
+# Admin created when there is no admins file yet
+DEFAULT_ADMINS = {
+    "8090093417": {
+        "telegram_id": 8090093417,
+        "level": 3,
+        "added_by": "system",
+        "added_at": "2024-01-01T00:00:00.000000"
+    }
+}
+
+
+class AdminRegistry:
+    """Admin levels kept in memory for lookups on every request.
+
+    Levels are served from a dict rebuilt only when the admins file changes.
+    The file is checked for changes (one stat call) at most every
+    `check_interval` seconds, so admins added from the bot show up in the
+    web app, and vice versa, within that delay; this process's own writes
+    are visible immediately.
+    """
+
+    def __init__(self, path=ADMINS_JSON_PATH, check_interval=1.0):
+        self.document = JsonDocument(path, default=dict, indent=2)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._levels = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def _refresh(self):
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.check_interval:
+                return self._levels
+        admins = self.document.read()
+        if not admins and not os.path.exists(self.document.path):
+            admins = self.load()
+        with self._lock:
+            if self.document.version != self._version:
+                self._levels = {str(telegram_id): admin['level'] for telegram_id, admin in admins.items()}
+                self._version = self.document.version
+            self._checked_at = time.monotonic()
+            return self._levels
+
+    def invalidate(self):
+        """Make the next lookup check the file again"""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def level(self, telegram_id):
+        return self._refresh().get(str(telegram_id), 0)
+
+    def load(self):
+        """Return a copy of all admin records, creating the file with the default admin if needed"""
+        if not self.document.read() and not os.path.exists(self.document.path):
+            self.save(dict(DEFAULT_ADMINS))
+        return self.document.load()
+
+    def save(self, admins):
+        self.document.save(admins)
+        self.invalidate()
+        return True
+
+
+admin_registry = AdminRegistry()
+
 def load_admins():
     """Load admins data from JSON file"""
-    try:
-        with open(ADMINS_JSON_PATH, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        # Initialize with level 3 admin
-        admins = {
-            "8090093417": {
-                "telegram_id": 8090093417,
-                "level": 3,
-                "added_by": "system",
-                "added_at": "2024-01-01T00:00:00.000000"
-            }
-        }
-        save_admins(admins)
-        return admins
+    return admin_registry.load()
 
 def save_admins(admins):
     """Save admins data to JSON file"""
     try:
-        os.makedirs(os.path.dirname(ADMINS_JSON_PATH), exist_ok=True)
-        with open(ADMINS_JSON_PATH, 'w') as f:
-            json.dump(admins, f, indent=2)
-        return True
+        return admin_registry.save(admins)
     except Exception as e:
         logging.error(f"Error saving admins: {e}")
         return False
 
 def is_admin(telegram_id):
     """Check if user is admin and return level"""
-    admins = load_admins()
-    admin = admins.get(str(telegram_id))
-    return admin['level'] if admin else 0
+    return admin_registry.level(telegram_id)
 
 def can_manage_admin(admin_level, target_level):
     """Check if admin can manage another admin"""
@@ -46,41 +94,44 @@ def can_manage_admin(admin_level, target_level):
 
 def add_admin(telegram_id, level, added_by_id):
     """Add new admin"""
-    admins = load_admins()
-    admin_level = is_admin(added_by_id)
-    
-    if not can_manage_admin(admin_level, level):
-        return False, "Недостаточно прав для добавления админа этого уровня"
-    
-    from datetime import datetime
-    admins[str(telegram_id)] = {
-        "telegram_id": telegram_id,
-        "level": level,
-        "added_by": added_by_id,
-        "added_at": datetime.now().isoformat()
-    }
-    
-    if save_admins(admins):
-        return True, "Админ успешно добавлен"
-    return False, "Ошибка при сохранении"
+    with admin_registry.document.locked():
+        admins = load_admins()
+        added_by = admins.get(str(added_by_id))
+        admin_level = added_by['level'] if added_by else 0
+
+        if not can_manage_admin(admin_level, level):
+            return False, "Недостаточно прав для добавления админа этого уровня"
+
+        admins[str(telegram_id)] = {
+            "telegram_id": telegram_id,
+            "level": level,
+            "added_by": added_by_id,
+            "added_at": datetime.now().isoformat()
+        }
+
+        if save_admins(admins):
+            return True, "Админ успешно добавлен"
+        return False, "Ошибка при сохранении"
 
 def remove_admin(telegram_id, removed_by_id):
     """Remove admin"""
-    admins = load_admins()
-    admin_level = is_admin(removed_by_id)
-    target_admin = admins.get(str(telegram_id))
-    
-    if not target_admin:
-        return False, "Админ не найден"
-    
-    if not can_manage_admin(admin_level, target_admin['level']):
-        return False, "Недостаточно прав для удаления этого админа"
-    
-    del admins[str(telegram_id)]
-    
-    if save_admins(admins):
-        return True, "Админ успешно удален"
-    return False, "Ошибка при сохранении"
+    with admin_registry.document.locked():
+        admins = load_admins()
+        removed_by = admins.get(str(removed_by_id))
+        admin_level = removed_by['level'] if removed_by else 0
+        target_admin = admins.get(str(telegram_id))
+
+        if not target_admin:
+            return False, "Админ не найден"
+
+        if not can_manage_admin(admin_level, target_admin['level']):
+            return False, "Недостаточно прав для удаления этого админа"
+
+        del admins[str(telegram_id)]
+
+        if save_admins(admins):
+            return True, "Админ успешно удален"
+        return False, "Ошибка при сохранении"
 
 def get_admins_list():
     """Get formatted list of admins"""
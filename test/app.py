@@ -1,14 +1,31 @@
 import os
 import json
+import math
+import hashlib
 import logging
-import requests
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime
 from functools import wraps
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, Response, g, has_request_context, render_template, stream_template, request, redirect, url_for, flash, jsonify, session
 from werkzeug.middleware.proxy_fix import ProxyFix
-from translations import get_translation, get_companies, TRANSLATIONS
-from config import BOT_TOKEN, GROUP_ID, THREAD_ID, NOTIFICATION_THREAD_ID, USERS_JSON_PATH, BOOKINGS_JSON_PATH
+from translations import get_translation, get_translator, get_companies, TRANSLATIONS
+from config import (GROUP_ID, THREAD_ID, NOTIFICATION_THREAD_ID, OUTBOX_JSONL_PATH,
+                    NOTIFICATION_SCHEDULER_ENABLED, WEB_RATE_LIMIT, WEB_RATE_BURST, WEB_GLOBAL_RATE_LIMIT,
+                    WEB_GLOBAL_RATE_BURST, MAX_EVENT_STREAMS, TRUSTED_PROXIES)
 from admins import is_admin
+from booking_index import weekly_dates
+from events import EventBroker
+from outbox import NotificationOutbox
+from telegram_client import telegram_client
+from membership import membership_cache, MEMBER_STATUSES
+from storage import JsonDocument, encode_cursor, decode_cursor
+from scheduler import NotificationScheduler
+from archive import BookingArchive
+from booking_service import (KZ_TIMEZONE, DATA_DIR, rooms_store, booking_repository, users_store, id_sequence,
+                             WORKING_DAY_START, WORKING_DAY_END, WORKING_DAY_MIN_BOOKING, next_booking_ids,
+                             current_booking_index, apply_booking_changes, store_bookings, new_booking,
+                             is_booking_time_valid, room_statuses, free_slots)
+from ratelimit import TokenBucketLimiter
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -17,87 +34,202 @@ logger = logging.getLogger(__name__) # Initialize logger
 # Create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+if TRUSTED_PROXIES:
+    # Take the client address from the X-Forwarded-For of the trusted proxies
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=0, x_host=0)
+
+# Requests are rate limited per signed-in user, or per address before sign-in
+request_limiter = TokenBucketLimiter(WEB_RATE_LIMIT, WEB_RATE_BURST, WEB_GLOBAL_RATE_LIMIT, WEB_GLOBAL_RATE_BURST)
+
+@app.before_request
+def rate_limit_requests():
+    if request.endpoint == 'static':
+        return None
+    retry_after = request_limiter.acquire(session.get('telegram_id') or request.remote_addr)
+    if not retry_after:
+        return None
+    logger.info(f"Rate limited {request.method} {request.path} for {session.get('telegram_id') or request.remote_addr}")
+    headers = {'Retry-After': str(math.ceil(retry_after))}
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'Too many requests'}), 429, headers
+    message = get_translation(session.get('lang', 'ru'), 'too_many_requests', 'Слишком много запросов, попробуйте позже')
+    return Response(message, status=429, headers=headers, mimetype='text/plain')
+
+notifications_store = JsonDocument(os.path.join(DATA_DIR, 'notifications.json'), indent=2, ensure_ascii=False)
+recurring_notifications_store = JsonDocument(os.path.join(DATA_DIR, 'recurring_notifications.json'), indent=2, ensure_ascii=False)
+booking_archive = BookingArchive()
+
+# Datasets are read at most once per request and shared by everything the
+# request calls (views, helpers, context processors) through flask.g
+def request_cached(name, loader):
+    """Return loader() memoized for the current request; outside a request just call it"""
+    if not has_request_context():
+        return loader()
+    cache = g.setdefault('data_cache', {})
+    if name not in cache:
+        cache[name] = loader()
+    return cache[name]
+
+def update_request_cache(name, value=None):
+    """Replace a memoized dataset after a write, or drop it when value is None"""
+    if has_request_context():
+        cache = g.setdefault('data_cache', {})
+        if value is None:
+            cache.pop(name, None)
+        else:
+            cache[name] = value
 
 def load_rooms():
     """Load rooms data from JSON file"""
-    try:
-        # Use absolute path based on script location
-        import os
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        rooms_path = os.path.join(script_dir, 'data', 'rooms.json')
-        with open(rooms_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
+    rooms = request_cached('rooms', rooms_store.load)
+    if not rooms:
         logging.error("Rooms data file not found")
-        return []
+    return rooms
 
 def load_bookings():
-    """Load bookings data from JSON file"""
-    try:
-        with open(BOOKINGS_JSON_PATH, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        logging.debug("Bookings file not found, creating empty bookings")
-        return []
+    """Load all bookings from the booking repository"""
+    return booking_repository.all()
 
 def save_bookings(bookings):
-    """Save bookings data to JSON file"""
+    """Replace all stored bookings"""
     try:
-        os.makedirs(os.path.dirname(BOOKINGS_JSON_PATH), exist_ok=True)
-        with open(BOOKINGS_JSON_PATH, 'w') as f:
-            json.dump(bookings, f, indent=2)
+        booking_repository.replace_all(bookings)
         return True
     except Exception as e:
         logging.error(f"Error saving bookings: {e}")
         return False
 
+def next_record_id(name, store):
+    """Reserve an id for a new record of a JSON document such as notifications"""
+    return id_sequence.next_id(name, lambda: max((r['id'] for r in store.read()), default=0))
+
+def get_booking_index():
+    """Get the booking index, checking once per request whether it is current"""
+    return request_cached('booking_index', current_booking_index)
+
+def sync_booking_index(added=(), removed=()):
+    """Apply saved booking changes to the index instead of rebuilding it"""
+    # Later reads in this request must check the index again
+    update_request_cache('booking_index')
+    apply_booking_changes(added, removed)
+
+def room_date_etag_parts(room_id, date):
+    """Values that change whenever the confirmed bookings of a room on a date change"""
+    index = get_booking_index()
+    return [room_id, date, index.key_digest(room_id, date)]
+
+def conditional_json(etag_parts, build):
+    """Return build() as JSON with a strong ETag, or 304 if the client already has it.
+
+    build is only called when the client's copy is out of date.
+    """
+    etag = hashlib.sha1(json.dumps(etag_parts).encode()).hexdigest()[:20]
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Live updates for the dashboard and schedule pages (Server-Sent Events)
+event_broker = EventBroker(max_subscribers=MAX_EVENT_STREAMS)
+_live_state_lock = threading.Lock()
+_published_room_statuses = {}
+_published_booking_version = None
+
+def publish_booking_event(event, bookings):
+    """Publish a booking change to live subscribers"""
+    global _published_booking_version
+    summaries = [{key: booking.get(key) for key in ('id', 'room_id', 'date', 'start_time', 'end_time')}
+                 for booking in bookings]
+    event_broker.publish(event, {'bookings': summaries})
+    with _live_state_lock:
+        _published_booking_version = booking_repository.version
+    publish_room_status_changes()
+
+def publish_room_status_changes():
+    """Publish rooms whose status differs from what was last published"""
+    if not event_broker.subscriber_count:
+        return
+    statuses = get_room_statuses([room['id'] for room in rooms_store.read()])
+    with _live_state_lock:
+        changed = {room_id: status for room_id, status in statuses.items()
+                   if _published_room_statuses.get(room_id) != status}
+        _published_room_statuses.update(changed)
+    if changed:
+        event_broker.publish('room_status', changed)
+
+def publish_live_updates():
+    """Periodic tick: status transitions over time and bookings changed by other processes"""
+    global _published_booking_version
+    version = booking_repository.version
+    with _live_state_lock:
+        changed_elsewhere = _published_booking_version is not None and version != _published_booking_version
+        _published_booking_version = version
+    if changed_elsewhere:
+        event_broker.publish('bookings_changed', {})
+    publish_room_status_changes()
+
+event_broker.set_ticker(publish_live_updates)
+
+def add_bookings(new_bookings):
+    """Store new bookings and add them to the index"""
+    if not store_bookings(new_bookings):
+        return False
+    # Later reads in this request must check the index again
+    update_request_cache('booking_index')
+    publish_booking_event('booking_created', new_bookings)
+    return True
+
+def replace_booking(old_booking, new_booking):
+    """Store an edited booking and move it in the index"""
+    try:
+        if not booking_repository.update(new_booking):
+            return False
+    except Exception as e:
+        logging.error(f"Error updating booking: {e}")
+        return False
+    sync_booking_index(added=[new_booking], removed=[old_booking])
+    publish_booking_event('booking_updated', [new_booking])
+    return True
+
+def remove_booking(booking_id):
+    """Delete a booking and drop it from the index; returns the deleted booking"""
+    try:
+        deleted_booking = booking_repository.delete(booking_id)
+    except Exception as e:
+        logging.error(f"Error deleting booking: {e}")
+        return None
+    if deleted_booking:
+        sync_booking_index(removed=[deleted_booking])
+        publish_booking_event('booking_deleted', [deleted_booking])
+    return deleted_booking
+
 def load_notifications():
     """Load notifications data from JSON file"""
-    try:
-        # Use absolute path based on script location
-        import os
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        notifications_path = os.path.join(script_dir, 'data', 'notifications.json')
-        with open(notifications_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        logging.debug("Notifications file not found, creating empty notifications")
-        return []
+    return notifications_store.load()
 
 def save_notifications(notifications):
     """Save notifications data to JSON file"""
     try:
-        os.makedirs(os.path.dirname(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')), exist_ok=True)
-        notifications_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'notifications.json')
-        with open(notifications_path, 'w', encoding='utf-8') as f:
-            json.dump(notifications, f, indent=2, ensure_ascii=False)
-        return True
+        saved = notifications_store.save(notifications)
+        notification_scheduler.wake()
+        return saved
     except Exception as e:
         logging.error(f"Error saving notifications: {e}")
         return False
 
 def load_recurring_notifications():
     """Load recurring notifications data from JSON file"""
-    try:
-        # Use absolute path based on script location
-        import os
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        recurring_notifications_path = os.path.join(script_dir, 'data', 'recurring_notifications.json')
-        with open(recurring_notifications_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        logging.debug("Recurring notifications file not found, creating empty recurring notifications")
-        return []
+    return recurring_notifications_store.load()
 
 def save_recurring_notifications(recurring_notifications):
     """Save recurring notifications data to JSON file"""
     try:
-        os.makedirs(os.path.dirname(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')), exist_ok=True)
-        recurring_notifications_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'recurring_notifications.json')
-        with open(recurring_notifications_path, 'w', encoding='utf-8') as f:
-            json.dump(recurring_notifications, f, indent=2, ensure_ascii=False)
-        return True
+        saved = recurring_notifications_store.save(recurring_notifications)
+        notification_scheduler.wake()
+        return saved
     except Exception as e:
         logging.error(f"Error saving recurring notifications: {e}")
         return False
@@ -126,34 +258,44 @@ def clear_all_system_data():
 def send_telegram_notification(user_id, message):
     """Send notification to user via Telegram bot"""
     try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        data = {
-            'chat_id': user_id,
-            'text': message,
-            'parse_mode': 'HTML'
-        }
-        response = requests.post(url, json=data, timeout=10)
-        return response.json().get('ok', False)
+        return telegram_client.send_message(user_id, message, parse_mode='HTML').get('ok', False)
     except Exception as e:
         logging.error(f"Error sending Telegram notification: {e}")
         return False
 
+# Messages to users are delivered in the background so requests never wait for Telegram
+notification_outbox = NotificationOutbox(
+    OUTBOX_JSONL_PATH,
+    telegram_client.send_message,
+    lambda: id_sequence.next_id('outbox'),
+    workers=int(os.environ.get('OUTBOX_WORKERS', 2))
+)
+# Resume messages left pending by a previous process without waiting for a new one
+notification_outbox.start()
+
+@app.before_request
+def start_notification_outbox():
+    # Restarts the workers in worker processes forked after import
+    notification_outbox.start()
+
+def queue_telegram_notification(user_id, message):
+    """Queue a notification to a user for background delivery; returns the outbox id"""
+    try:
+        return notification_outbox.enqueue(user_id, message, parse_mode='HTML')
+    except Exception as e:
+        logging.error(f"Error queueing Telegram notification: {e}")
+        return None
+
 def send_group_notification(message, thread_id=None):
     """Send notification to Telegram group"""
     try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        data = {
-            'chat_id': GROUP_ID,
-            'text': message,
-            'parse_mode': 'HTML'
-        }
+        options = {'parse_mode': 'HTML'}
         # Use default thread ID if none provided
         if thread_id is None:
             thread_id = THREAD_ID
         if thread_id:
-            data['message_thread_id'] = thread_id
-        response = requests.post(url, json=data, timeout=10)
-        return response.json().get('ok', False)
+            options['message_thread_id'] = thread_id
+        return telegram_client.send_message(GROUP_ID, message, **options).get('ok', False)
     except Exception as e:
         logging.error(f"Error sending group notification: {e}")
         return False
@@ -161,89 +303,114 @@ def send_group_notification(message, thread_id=None):
 def send_recurring_notification_to_group(message):
     """Send recurring notification to specific thread in Telegram group"""
     try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-        data = {
-            'chat_id': GROUP_ID,
-            'text': message,
-            'parse_mode': 'HTML',
-            'message_thread_id': int(NOTIFICATION_THREAD_ID)
-        }
-        response = requests.post(url, json=data, timeout=10)
-        result = response.json()
+        result = telegram_client.send_message(GROUP_ID, message, parse_mode='HTML',
+                                              message_thread_id=int(NOTIFICATION_THREAD_ID))
         logging.info(f"Sent notification to group: {result.get('ok', False)} - Response: {result}")
         return result.get('ok', False)
     except Exception as e:
         logging.error(f"Error sending notification to group: {e}")
         return False
 
-def create_recurring_bookings(base_booking, days_of_week, weeks_count):
-    """Create recurring bookings for specified days and weeks"""
-    bookings = load_bookings()
-    new_bookings = []
+def send_scheduled_notification(notification):
+    """Send a one-off notification record to its thread in the group"""
+    thread_id = notification.get('thread_id')
+    return send_group_notification(notification['message'], int(thread_id) if thread_id else None)
+
+def send_scheduled_recurring_notification(notification):
+    """Send a recurring notification record to the notifications thread"""
+    return send_recurring_notification_to_group(notification['message'])
+
+# Stored notifications are sent by a background thread at their scheduled times
+notification_scheduler = NotificationScheduler({
+    'notifications': (notifications_store, send_scheduled_notification),
+    'recurring_notifications': (recurring_notifications_store, send_scheduled_recurring_notification),
+}, KZ_TIMEZONE)
+
+if NOTIFICATION_SCHEDULER_ENABLED:
+    notification_scheduler.start()
+
+    @app.before_request
+    def start_notification_scheduler():
+        # Restarts the thread in worker processes forked after import
+        notification_scheduler.start()
+
+def plan_recurring_bookings(base_booking, room_ids, weekdays, weeks_count):
+    """Expand a weekly recurrence over several rooms and check it against the booking index.
+
+    Returns (new_bookings, conflicts): the occurrences that can be inserted,
+    with ids assigned, and one {'room_id', 'date', 'booking'} entry for every
+    occurrence that clashes with an existing booking.
+    """
+    index = get_booking_index()
+    rooms = {room['id']: room for room in load_rooms()}
 
     base_date = datetime.strptime(base_booking['date'], '%Y-%m-%d').date()
+    today = datetime.now().date()
+    dates = [d.strftime('%Y-%m-%d') for d in weekly_dates(max(base_date, today), weekdays, weeks_count)]
 
-    for week in range(weeks_count):
-        for day_offset in days_of_week:
-            # Calculate the date for this occurrence
-            current_date = base_date + timedelta(days=day_offset + (week * 7))
-            date_str = current_date.strftime('%Y-%m-%d')
+    taken = index.find_conflicts(room_ids, dates, base_booking['start_time'], base_booking['end_time'])
 
-            # Skip if date is in the past
-            if current_date < datetime.now().date():
+    new_bookings = []
+    conflicts = []
+    created_at = datetime.now().isoformat()
+    for room_id in room_ids:
+        room_name = rooms.get(room_id, {}).get('name', f'Room {room_id}')
+        for date_str in dates:
+            booking_id = taken.get((room_id, date_str))
+            if booking_id is not None:
+                conflicts.append({'room_id': room_id, 'room_name': room_name, 'date': date_str,
+                                  'booking': booking_repository.get(booking_id)})
                 continue
+            recurring_booking = base_booking.copy()
+            recurring_booking.update({
+                'room_id': room_id,
+                'room_name': room_name,
+                'date': date_str,
+                'is_recurring': True,
+                'parent_booking_id': base_booking.get('id'),
+                'created_at': created_at
+            })
+            new_bookings.append(recurring_booking)
 
-            # Check if room is available for this time slot
-            if is_room_available(base_booking['room_id'], date_str, 
-                               base_booking['start_time'], base_booking['end_time']):
-
-                recurring_booking = base_booking.copy()
-                recurring_booking.update({
-                    'id': len(bookings) + len(new_bookings) + 1,
-                    'date': date_str,
-                    'is_recurring': True,
-                    'parent_booking_id': base_booking.get('id'),
-                    'created_at': datetime.now().isoformat()
-                })
-                new_bookings.append(recurring_booking)
+    # Reserve all ids for the series in one step
+    for booking, booking_id in zip(new_bookings, next_booking_ids(len(new_bookings))):
+        booking['id'] = booking_id
 
-    return new_bookings
+    return new_bookings, conflicts
 
 def load_users():
-    """Load users data from JSON file"""
-    try:
-        with open(USERS_JSON_PATH, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        logging.debug("Users file not found, creating empty users")
-        return {}
+    """Load users data from JSON file for modification (always current; use under users_store.locked())"""
+    return users_store.load()
+
+def get_users():
+    """Users data for reading, loaded once per request; must not be modified"""
+    return request_cached('users', users_store.read)
 
 def save_users(users):
     """Save users data to JSON file"""
     try:
-        os.makedirs(os.path.dirname(USERS_JSON_PATH), exist_ok=True)
-        with open(USERS_JSON_PATH, 'w') as f:
-            json.dump(users, f, indent=2)
-        return True
+        saved = users_store.save(users)
+        update_request_cache('users', users_store.read())
+        return saved
     except Exception as e:
         logging.error(f"Error saving users: {e}")
         return False
 
+def _lookup_group_membership(user_id):
+    """Ask Telegram whether the user is in the group; raises on transient errors"""
+    data = telegram_client.get_chat_member(GROUP_ID, user_id)
+
+    if data.get('ok'):
+        status = data.get('result', {}).get('status')
+        return status in MEMBER_STATUSES
+    if data.get('error_code') == 429 or data.get('error_code', 0) >= 500:
+        raise RuntimeError(data.get('description', 'Telegram API error'))
+    return False
+
 def check_telegram_group_membership(user_id):
     """Check if user is a member of the Telegram group"""
     try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChatMember"
-        params = {
-            'chat_id': GROUP_ID,
-            'user_id': user_id
-        }
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-
-        if data.get('ok'):
-            status = data.get('result', {}).get('status')
-            return status in ['creator', 'administrator', 'member']
-        return False
+        return membership_cache.check(user_id, _lookup_group_membership)
     except Exception as e:
         logging.error(f"Error checking Telegram group membership: {e}")
         return False
@@ -268,129 +435,19 @@ def is_user_registered():
     if not telegram_id:
         return False
 
-    users = load_users()
-    return str(telegram_id) in users
+    return str(telegram_id) in get_users()
 
-def is_room_available(room_id, date, start_time, end_time):
+def is_room_available(room_id, date, start_time, end_time, exclude_id=None):
     """Check if a room is available for the given time slot"""
-    bookings = load_bookings()
+    return get_booking_index().is_available(room_id, date, start_time, end_time, exclude_id)
 
-    for booking in bookings:
-        if (booking['room_id'] == room_id and 
-            booking['date'] == date and
-            booking['status'] == 'confirmed'):
-
-            # Check for time overlap
-            booking_start = datetime.strptime(booking['start_time'], '%H:%M').time()
-            booking_end = datetime.strptime(booking['end_time'], '%H:%M').time()
-            slot_start = datetime.strptime(start_time, '%H:%M').time()
-            slot_end = datetime.strptime(end_time, '%H:%M').time()
-
-            # Check if there's any overlap
-            if not (slot_end <= booking_start or slot_start >= booking_end):
-                return False
-
-    return True
-
-def is_booking_time_valid(date, start_time, end_time):
-    """Validate booking time restrictions"""
-    now = datetime.now()
-
-    try:
-        # Parse booking date and time
-        booking_date = datetime.strptime(date, '%Y-%m-%d').date()
-        booking_start_time = datetime.strptime(start_time, '%H:%M').time()
-        booking_end_time = datetime.strptime(end_time, '%H:%M').time()
-    except ValueError:
-        return False, 'invalid_time'
-
-    # Create full datetime objects
-    booking_datetime = datetime.combine(booking_date, booking_start_time)
-
-    # More strict past time check - add 1 minute buffer to current time
-    current_time_with_buffer = now + timedelta(minutes=1)
-
-    # Check if booking is in the past (with buffer)
-    if booking_datetime <= current_time_with_buffer:
-        return False, 'cannot_book_past_time'
-
-    # Additional check for today's date
-    if booking_date == now.date():
-        current_time = now.time()
-        current_hour = now.hour
-        current_minute = now.minute
-        start_hour = booking_start_time.hour
-        start_minute = booking_start_time.minute
-
-        # If it's the same hour, check minutes more strictly
-        if start_hour == current_hour and start_minute <= current_minute + 1:
-            return False, 'cannot_book_past_time'
-        elif start_hour < current_hour:
-            return False, 'cannot_book_past_time'
-
-    # Check working hours (9:00 - 18:00)
-    start_hour = booking_start_time.hour
-    end_hour = booking_end_time.hour
-    start_minute = booking_start_time.minute
-    end_minute = booking_end_time.minute
-
-    # Start time must be between 9:00 and 17:45
-    if start_hour < 9 or (start_hour == 17 and start_minute > 45) or start_hour >= 18:
-        return False, 'outside_working_hours'
-
-    # End time must be between 9:15 and 18:00 (18:01 allowed for form validation)
-    if end_hour < 9 or (end_hour == 9 and end_minute < 15) or end_hour > 18 or (end_hour == 18 and end_minute > 1):
-        return False, 'outside_working_hours'
-
-    # End time must be after start time
-    if booking_end_time <= booking_start_time:
-        return False, 'invalid_time'
-
-    return True, None
+def get_room_statuses(room_ids):
+    """Get current status of several rooms; see booking_service.room_statuses"""
+    return room_statuses(get_booking_index(), room_ids)
 
 def get_room_status(room_id):
     """Get current status of a room (available/occupied)"""
-    from datetime import timezone, timedelta
-
-    # Use Kazakhstan time (UTC+5)
-    kz_timezone = timezone(timedelta(hours=5))
-    now = datetime.now(kz_timezone)
-    current_date = now.strftime('%Y-%m-%d')
-    current_time = now.time()
-
-    bookings = load_bookings()
-
-    logging.debug(f"Checking room {room_id} status at {current_time.strftime('%H:%M:%S')} on {current_date} (Kazakhstan time UTC+5)")
-
-    # Check all bookings for today
-    for booking in bookings:
-        if (booking['room_id'] == room_id and 
-            booking['date'] == current_date and
-            booking['status'] == 'confirmed'):
-
-            try:
-                # Parse booking times
-                booking_start = datetime.strptime(booking['start_time'], '%H:%M').time()
-                booking_end = datetime.strptime(booking['end_time'], '%H:%M').time()
-
-                logging.debug(f"Found booking {booking_start.strftime('%H:%M')} - {booking_end.strftime('%H:%M')} by {booking.get('user_name', 'Unknown')}")
-
-                # Convert times to minutes for easier comparison
-                current_minutes = current_time.hour * 60 + current_time.minute
-                start_minutes = booking_start.hour * 60 + booking_start.minute
-                end_minutes = booking_end.hour * 60 + booking_end.minute
-
-                # Check if current time is within booking period (inclusive of start, exclusive of end)
-                if start_minutes <= current_minutes < end_minutes:
-                    logging.debug(f"Room is OCCUPIED - Current time {current_time.strftime('%H:%M')} is within booking {booking_start.strftime('%H:%M')}-{booking_end.strftime('%H:%M')} by {booking.get('user_name', 'Unknown')}")
-                    return 'occupied'
-
-            except ValueError as e:
-                logging.error(f"Invalid time format in booking: {booking} - Error: {e}")
-                continue
-
-    logging.debug(f"Room is AVAILABLE - No active bookings at current time")
-    return 'available'
+    return get_room_statuses([room_id])[room_id]['status']
 
 @app.context_processor
 def inject_globals():
@@ -401,8 +458,7 @@ def inject_globals():
     admin_level = 0
 
     if telegram_id:
-        users = load_users()
-        user_data = users.get(str(telegram_id))
+        user_data = get_users().get(str(telegram_id))
         admin_level = is_admin(telegram_id)
 
     def get_room_name(room, lang='ru'):
@@ -418,7 +474,7 @@ def inject_globals():
         return room.get('location', '')
 
     return {
-        'get_translation': lambda key, default=None: get_translation(lang, key, default),
+        'get_translation': get_translator(lang),
         'get_room_name': get_room_name,
         'get_room_location': get_room_location,
         'lang': lang,
@@ -487,8 +543,9 @@ def index():
     rooms = load_rooms()
 
     # Add current status to each room
-    for room in rooms:
-        room['current_status'] = get_room_status(room['id'])
+    statuses = get_room_statuses([room['id'] for room in rooms])
+    rooms = [dict(room, current_status=statuses[room['id']]['status'], status_details=statuses[room['id']])
+             for room in rooms]
 
     today = datetime.now().strftime('%Y-%m-%d')
     return render_template('index.html', rooms=rooms, today=today)
@@ -515,15 +572,17 @@ def register():
             return render_template('register.html')
 
         # Save user info to JSON file
-        users = load_users()
-        users[str(telegram_id)] = {
-            'telegram_id': telegram_id,
-            'name': name,
-            'company': company,
-            'registered_at': datetime.now().isoformat()
-        }
+        with users_store.locked():
+            users = load_users()
+            users[str(telegram_id)] = {
+                'telegram_id': telegram_id,
+                'name': name,
+                'company': company,
+                'registered_at': datetime.now().isoformat()
+            }
+            saved = save_users(users)
 
-        if save_users(users):
+        if saved:
             flash(get_translation(lang, 'registration_successful', 'Регистрация успешна'), 'success')
             return redirect(url_for('index'))
         else:
@@ -539,21 +598,21 @@ def profile():
         return redirect(url_for('register'))
 
     telegram_id = session.get('telegram_id')
-    users = load_users()
-    user_data = users.get(str(telegram_id))
+    user_data = get_users().get(str(telegram_id))
 
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
         company = request.form.get('company', '').strip()
 
         if name and company:
-            users[str(telegram_id)].update({
-                'name': name,
-                'company': company,
-                'updated_at': datetime.now().isoformat()
-            })
+            with users_store.locked():
+                users = load_users()
+                user_data = dict(users.get(str(telegram_id), user_data), name=name, company=company,
+                                 updated_at=datetime.now().isoformat())
+                users[str(telegram_id)] = user_data
+                saved = save_users(users)
 
-            if save_users(users):
+            if saved:
                 flash(get_translation(get_user_lang(), 'profile_updated', 'Profile updated successfully'), 'success')
 
     return render_template('profile.html', user_data=user_data)
@@ -598,7 +657,7 @@ def process_booking(room_id):
 
     # Get user data
     telegram_id = session.get('telegram_id')
-    users = load_users()
+    users = get_users()
     user_data = users.get(str(telegram_id))
 
     # Validate form data
@@ -621,31 +680,20 @@ def process_booking(room_id):
             flash(get_translation(lang, 'invalid_time'), 'error')
             return render_template('book_room.html', room=room, today=datetime.now().strftime('%Y-%m-%d'))
 
-    # Check availability
-    if not is_room_available(room_id, date, start_time, end_time):
+    # Check availability and save under the write lock so concurrent
+    # requests cannot both take the same slot
+    with booking_repository.write_lock():
+        available = is_room_available(room_id, date, start_time, end_time)
+        if available:
+            # Create booking
+            booking = new_booking(room, telegram_id, user_data, date, start_time, end_time, purpose)
+            saved = add_bookings([booking])
+
+    if not available:
         flash(get_translation(lang, 'room_unavailable'), 'error')
         return render_template('book_room.html', room=room, today=datetime.now().strftime('%Y-%m-%d'))
 
-    # Create booking
-    bookings = load_bookings()
-    new_booking = {
-        'id': len(bookings) + 1,
-        'room_id': room_id,
-        'room_name': room['name'],
-        'date': date,
-        'start_time': start_time,
-        'end_time': end_time,
-        'telegram_id': telegram_id,
-        'user_name': user_data.get('name'),
-        'user_company': user_data.get('company'),
-        'purpose': purpose,
-        'status': 'confirmed',
-        'created_at': datetime.now().isoformat()
-    }
-
-    bookings.append(new_booking)
-
-    if save_bookings(bookings):
+    if saved:
         flash(get_translation(lang, 'booking_successful'), 'success')
         # Redirect to schedule to show the booking
         return redirect(url_for('room_schedule', room_id=room_id, date=date))
@@ -661,19 +709,48 @@ def room_availability_api(room_id):
     if not date:
         return jsonify({'error': 'Date parameter required'}), 400
 
-    bookings = load_bookings()
-    room_bookings = [b for b in bookings if b['room_id'] == room_id and b['date'] == date and b['status'] == 'confirmed']
+    def build():
+        occupied_slots = []
+        for booking in booking_repository.for_room_date(room_id, date):
+            occupied_slots.append({
+                'start': booking['start_time'],
+                'end': booking['end_time'],
+                'user': booking['user_name'],
+                'purpose': booking.get('purpose', '')
+            })
+        return {'occupied_slots': occupied_slots}
 
-    occupied_slots = []
-    for booking in room_bookings:
-        occupied_slots.append({
-            'start': booking['start_time'],
-            'end': booking['end_time'],
-            'user': booking['user_name'],
-            'purpose': booking.get('purpose', '')
-        })
+    return conditional_json(room_date_etag_parts(room_id, date), build)
 
-    return jsonify({'occupied_slots': occupied_slots})
+@app.route('/api/free-slots')
+@login_required
+def free_slots_api():
+    """Earliest free windows across all rooms for a date range.
+
+    Query parameters: date_from and date_to (YYYY-MM-DD, at most 31 days),
+    duration in minutes, capacity (minimum seats), features (repeated or
+    comma-separated) and limit. Windows lie within working hours.
+    """
+    try:
+        date_from = datetime.strptime(request.args.get('date_from', datetime.now(KZ_TIMEZONE).strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.args.get('date_to', date_from.strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+        duration = int(request.args.get('duration', 60))
+        capacity = int(request.args.get('capacity', 0))
+        limit = min(int(request.args.get('limit', 20)), 200)
+    except ValueError:
+        return jsonify({'error': 'Invalid parameters'}), 400
+
+    if date_to < date_from or (date_to - date_from).days > 31:
+        return jsonify({'error': 'date_to must be within 31 days after date_from'}), 400
+    if not WORKING_DAY_MIN_BOOKING <= duration <= WORKING_DAY_END - WORKING_DAY_START:
+        return jsonify({'error': 'Invalid duration'}), 400
+
+    features = {f.strip().lower() for value in request.args.getlist('features') for f in value.split(',') if f.strip()}
+    rooms = [room for room in load_rooms()
+             if room.get('capacity', 0) >= capacity
+             and features <= {f.lower() for f in room.get('features', [])}]
+    slots = free_slots(get_booking_index(), rooms, date_from, date_to, duration, limit)
+    return jsonify({'slots': slots})
 
 @app.route('/schedule/<int:room_id>')
 @login_required
@@ -690,8 +767,7 @@ def room_schedule(room_id):
         flash(get_translation(get_user_lang(), 'room_not_found', 'Room not found'), 'error')
         return redirect(url_for('index'))
 
-    bookings = load_bookings()
-    room_bookings = [b for b in bookings if b['room_id'] == room_id and b['date'] == date and b['status'] == 'confirmed']
+    room_bookings = booking_repository.for_room_date(room_id, date)
     room_bookings.sort(key=lambda x: x['start_time'])
 
     return render_template('schedule.html', room=room, bookings=room_bookings, selected_date=date)
@@ -701,35 +777,102 @@ def room_schedule(room_id):
 def api_room_schedule(room_id):
     """API endpoint for room schedule"""
     date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
-    bookings = load_bookings()
-    room_bookings = [b for b in bookings if b['room_id'] == room_id and b['date'] == date and b['status'] == 'confirmed']
-    room_bookings.sort(key=lambda x: x['start_time'])
 
-    return jsonify({'bookings': room_bookings})
+    def build():
+        room_bookings = booking_repository.for_room_date(room_id, date)
+        room_bookings.sort(key=lambda x: x['start_time'])
+        return {'bookings': room_bookings}
+
+    return conditional_json(room_date_etag_parts(room_id, date), build)
+
+# Paginated booking lists
+BOOKINGS_PAGE_SIZE = 50
+MAX_BOOKINGS_PAGE_SIZE = 500
+
+def booking_page_args():
+    """Parse the cursor, limit and scope query parameters of a paginated booking list.
+
+    scope is 'upcoming' (default, from today on), 'past' (newest first) or 'all'.
+    Raises ValueError for malformed parameters.
+    """
+    cursor = request.args.get('cursor')
+    limit = max(1, min(int(request.args.get('limit', BOOKINGS_PAGE_SIZE)), MAX_BOOKINGS_PAGE_SIZE))
+    scope = request.args.get('scope', 'upcoming')
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    args = {'after': decode_cursor(cursor) if cursor else None, 'limit': limit + 1}
+    if scope == 'past':
+        args.update(date_to=today, descending=True)
+    elif scope != 'all':
+        args['date_from'] = today
+    return scope, limit, args
+
+def split_page(bookings, limit):
+    """Cut the extra booking fetched to detect a next page; returns (page, next_cursor)"""
+    if len(bookings) > limit:
+        bookings = bookings[:limit]
+        return bookings, encode_cursor(bookings[-1])
+    return bookings, None
+
+def stream_bookings_json(bookings, next_cursor, room_names=None):
+    """Stream a page of bookings as JSON, serializing one booking at a time"""
+    def generate():
+        yield '{"bookings": ['
+        for i, booking in enumerate(bookings):
+            if room_names is not None:
+                booking = dict(booking, room_name=room_names.get(booking['room_id'], f"Room {booking['room_id']}"))
+            yield (',' if i else '') + json.dumps(booking, ensure_ascii=False)
+        yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+    return Response(generate(), mimetype='application/json')
 
 @app.route('/my-bookings')
 @login_required
 def my_bookings():
-    """Show user's bookings"""
+    """Show user's bookings, one page at a time"""
     if not is_user_registered():
         return redirect(url_for('register'))
 
-    telegram_id = session.get('telegram_id')
-    bookings = load_bookings()
-    user_bookings = [b for b in bookings if str(b.get('telegram_id')) == str(telegram_id)]
+    try:
+        scope, limit, page_args = booking_page_args()
+    except ValueError:
+        return redirect(url_for('my_bookings'))
 
-    # Sort by date and time
-    user_bookings.sort(key=lambda x: (x['date'], x['start_time']))
+    telegram_id = session.get('telegram_id')
+    user_bookings, next_cursor = split_page(booking_repository.user_page(telegram_id, **page_args), limit)
 
     # Add room names
-    rooms = load_rooms()
-    room_names = {room['id']: room['name'] for room in rooms}
-
-    for booking in user_bookings:
-        booking['room_name'] = room_names.get(booking['room_id'], f"Room {booking['room_id']}")
+    room_names = {room['id']: room['name'] for room in load_rooms()}
+    user_bookings = [dict(booking, room_name=room_names.get(booking['room_id'], f"Room {booking['room_id']}"))
+                     for booking in user_bookings]
 
     today = datetime.now().strftime('%Y-%m-%d')
-    return render_template('my_bookings.html', bookings=user_bookings, today=today)
+    return Response(stream_template('my_bookings.html', bookings=user_bookings, today=today,
+                                    scope=scope, next_cursor=next_cursor))
+
+@app.route('/api/my-bookings')
+@login_required
+def api_my_bookings():
+    """Cursor-paginated bookings of the current user"""
+    try:
+        scope, limit, page_args = booking_page_args()
+    except ValueError:
+        return jsonify({'error': 'Invalid parameters'}), 400
+
+    user_bookings, next_cursor = split_page(booking_repository.user_page(session.get('telegram_id'), **page_args), limit)
+    room_names = {room['id']: room['name'] for room in load_rooms()}
+    return stream_bookings_json(user_bookings, next_cursor, room_names)
+
+@app.route('/api/rooms/<int:room_id>/bookings')
+@login_required
+def api_room_bookings(room_id):
+    """Cursor-paginated confirmed bookings of a room across dates"""
+    try:
+        scope, limit, page_args = booking_page_args()
+    except ValueError:
+        return jsonify({'error': 'Invalid parameters'}), 400
+
+    room_bookings, next_cursor = split_page(booking_repository.room_page(room_id, **page_args), limit)
+    return stream_bookings_json(room_bookings, next_cursor)
 
 @app.route('/delete-booking/<int:booking_id>', methods=['POST'])
 @login_required
@@ -743,34 +886,21 @@ def delete_booking(booking_id):
     reason = request.form.get('admin_reason', '').strip()
 
     # If admin is deleting someone else's booking, reason is required
-    bookings = load_bookings()
-    booking_to_delete = None
-    target_booking = None
-
-    for i, booking in enumerate(bookings):
-        if booking['id'] == booking_id:
-            # Check if user owns booking or is admin
-            if str(booking.get('telegram_id')) == str(telegram_id):
-                # User deleting their own booking
-                booking_to_delete = i
-                target_booking = booking
-                break
-            elif admin_level > 0:
-                # Admin deleting someone else's booking
-                if not reason:
-                    flash('Администратор должен указать причину удаления бронирования', 'error')
-                    return redirect(request.referrer or url_for('my_bookings'))
-                booking_to_delete = i
-                target_booking = booking
-                break
-
-    if booking_to_delete is not None:
-        deleted_booking = bookings.pop(booking_to_delete)
-
-        if save_bookings(bookings):
+    booking = booking_repository.get(booking_id)
+    deleted_booking = None
+
+    if booking and str(booking.get('telegram_id')) != str(telegram_id) and admin_level > 0 and not reason:
+        flash('Администратор должен указать причину удаления бронирования', 'error')
+        return redirect(request.referrer or url_for('my_bookings'))
+
+    # Check if user owns booking or is admin
+    if booking and (str(booking.get('telegram_id')) == str(telegram_id) or admin_level > 0):
+        deleted_booking = remove_booking(booking_id)
+
+        if deleted_booking:
             # Send notification to user if admin deleted their booking
             if admin_level > 0 and str(deleted_booking.get('telegram_id')) != str(telegram_id):
-                users = load_users()
+                users = get_users()
                 admin_data = users.get(str(telegram_id))
                 admin_name = admin_data.get('name', 'Администратор') if admin_data else 'Администратор'
 
@@ -784,7 +914,7 @@ def delete_booking(booking_id):
                     f"По вопросам обращайтесь к администратору."
                 )
 
-                send_telegram_notification(deleted_booking.get('telegram_id'), notification_message)
+                queue_telegram_notification(deleted_booking.get('telegram_id'), notification_message)
 
             flash(get_translation(get_user_lang(), 'booking_deleted', 'Booking deleted successfully'), 'success')
         else:
@@ -794,8 +924,8 @@ def delete_booking(booking_id):
 
     # Redirect based on context
     if request.referrer and 'schedule' in request.referrer:
-        room_id = deleted_booking.get('room_id') if booking_to_delete is not None else None
-        date = deleted_booking.get('date') if booking_to_delete is not None else None
+        room_id = deleted_booking.get('room_id') if deleted_booking else None
+        date = deleted_booking.get('date') if deleted_booking else None
         if room_id and date:
             return redirect(url_for('room_schedule', room_id=room_id, date=date))
 
@@ -810,15 +940,11 @@ def edit_booking(booking_id):
 
     telegram_id = session.get('telegram_id')
     admin_level = is_admin(telegram_id)
-    bookings = load_bookings()
-    booking = None
+    booking = booking_repository.get(booking_id)
 
-    for b in bookings:
-        # Allow editing if user owns booking or is admin
-        if (b['id'] == booking_id and 
-            (str(b.get('telegram_id')) == str(telegram_id) or admin_level > 0)):
-            booking = b
-            break
+    # Allow editing if user owns booking or is admin
+    if booking and not (str(booking.get('telegram_id')) == str(telegram_id) or admin_level > 0):
+        booking = None
 
     if not booking:
         flash(get_translation(get_user_lang(), 'booking_not_found', 'Booking not found'), 'error')
@@ -844,19 +970,13 @@ def update_booking(booking_id):
     admin_level = is_admin(telegram_id)
     lang = get_user_lang()
 
-    bookings = load_bookings()
-    booking_index = None
-    original_booking = None
+    original_booking = booking_repository.get(booking_id)
 
-    for i, b in enumerate(bookings):
-        # Allow updating if user owns booking or is admin
-        if (b['id'] == booking_id and 
-            (str(b.get('telegram_id')) == str(telegram_id) or admin_level > 0)):
-            booking_index = i
-            original_booking = b
-            break
+    # Allow updating if user owns booking or is admin
+    if original_booking and not (str(original_booking.get('telegram_id')) == str(telegram_id) or admin_level > 0):
+        original_booking = None
 
-    if booking_index is None:
+    if original_booking is None:
         flash(get_translation(lang, 'booking_not_found', 'Booking not found'), 'error')
         return redirect(url_for('my_bookings'))
 
@@ -889,27 +1009,9 @@ def update_booking(booking_id):
         flash(get_translation(lang, 'invalid_time'), 'error')
         return redirect(url_for('edit_booking', booking_id=booking_id))
 
-    # Check availability (exclude current booking)
-    temp_bookings = [b for b in bookings if b['id'] != booking_id]
-    room_id = original_booking['room_id']
-
-    for booking in temp_bookings:
-        if (booking['room_id'] == room_id and 
-            booking['date'] == date and
-            booking['status'] == 'confirmed'):
-
-            # Check for time overlap
-            booking_start = datetime.strptime(booking['start_time'], '%H:%M').time()
-            booking_end = datetime.strptime(booking['end_time'], '%H:%M').time()
-            slot_start = datetime.strptime(start_time, '%H:%M').time()
-            slot_end = datetime.strptime(end_time, '%H:%M').time()
-
-            if not (slot_end <= booking_start or slot_start >= booking_end):
-                flash(get_translation(lang, 'room_unavailable'), 'error')
-                return redirect(url_for('edit_booking', booking_id=booking_id))
-
     # Update booking
-    bookings[booking_index].update({
+    updated_booking = dict(original_booking)
+    updated_booking.update({
         'date': date,
         'start_time': start_time,
         'end_time': end_time,
@@ -918,10 +1020,23 @@ def update_booking(booking_id):
         'updated_at': datetime.now().isoformat()
     })
 
-    if save_bookings(bookings):
+    with booking_repository.write_lock():
+        # The booking must not have been changed by another request since we read it
+        if booking_repository.get(booking_id) != original_booking:
+            flash(get_translation(lang, 'update_error', 'Error updating booking'), 'error')
+            return redirect(url_for('edit_booking', booking_id=booking_id))
+
+        # Check availability (exclude current booking)
+        if not is_room_available(original_booking['room_id'], date, start_time, end_time, exclude_id=booking_id):
+            flash(get_translation(lang, 'room_unavailable'), 'error')
+            return redirect(url_for('edit_booking', booking_id=booking_id))
+
+        saved = replace_booking(original_booking, updated_booking)
+
+    if saved:
         # Send notification to user if admin modified their booking
         if admin_level > 0 and str(original_booking.get('telegram_id')) != str(telegram_id):
-            users = load_users()
+            users = get_users()
             admin_data = users.get(str(telegram_id))
             admin_name = admin_data.get('name', 'Администратор') if admin_data else 'Администратор'
             edit_reason = admin_reason if admin_reason else 'Причина не указана'
@@ -938,7 +1053,7 @@ def update_booking(booking_id):
                 f"По вопросам обращайтесь к администратору."
             )
 
-            send_telegram_notification(original_booking.get('telegram_id'), notification_message)
+            queue_telegram_notification(original_booking.get('telegram_id'), notification_message)
 
         flash(get_translation(lang, 'booking_updated', 'Booking updated successfully'), 'success')
         # Redirect based on context
@@ -954,12 +1069,78 @@ def update_booking(booking_id):
 def api_room_status():
     """API endpoint for getting all room statuses"""
     rooms = load_rooms()
-    room_statuses = {}
+    room_ids = [room['id'] for room in rooms]
+    # Statuses depend on today's bookings and on the current minute
+    now = datetime.now(KZ_TIMEZONE)
+    today = now.strftime('%Y-%m-%d')
+    index = get_booking_index()
+    etag_parts = ['status', now.strftime('%H:%M'),
+                  [(room_id, index.key_digest(room_id, today)) for room_id in room_ids]]
+    return conditional_json(etag_parts, lambda: get_room_statuses(room_ids))
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    """Server-Sent Events stream of booking changes and room status transitions.
+
+    A stream holds its server thread while it is open, so it is only served
+    by threaded servers and up to MAX_EVENT_STREAMS per process. Otherwise
+    the answer is 503 and the page falls back to polling.
+    """
+    if not request.environ.get('wsgi.multithread'):
+        return Response(status=503)
+    subscription = event_broker.subscribe()
+    if subscription is None:
+        return Response(status=503, headers={'Retry-After': '60'})
+
+    rooms = load_rooms()
+    initial_statuses = get_room_statuses([room['id'] for room in rooms])
+    response = Response(
+        event_broker.stream(subscription, initial_events=[('room_status', initial_statuses)]),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Also frees the slot when the stream is closed before it started
+    response.call_on_close(lambda: event_broker.unsubscribe(subscription))
+    return response
+
+@app.route('/api/outbox/<int:message_id>')
+@login_required
+def api_outbox_status(message_id):
+    """Delivery status of a queued Telegram notification (admins only)"""
+    if is_admin(session.get('telegram_id')) == 0:
+        return jsonify({'error': 'Admin access required'}), 403
+
+    state = notification_outbox.status(message_id)
+    if state is None:
+        return jsonify({'error': 'Message not found'}), 404
+
+    return jsonify({key: state.get(key) for key in
+                    ('id', 'chat_id', 'status', 'attempts', 'error', 'created_at', 'updated_at')})
+
+@app.route('/api/archive/bookings')
+@login_required
+def api_archived_bookings():
+    """Archived bookings for reporting (admins only).
+
+    Query parameters: date_from and date_to (YYYY-MM-DD, inclusive), room_id
+    and telegram_id.
+    """
+    if is_admin(session.get('telegram_id')) == 0:
+        return jsonify({'error': 'Admin access required'}), 403
 
-    for room in rooms:
-        room_statuses[room['id']] = get_room_status(room['id'])
+    room_id = request.args.get('room_id', type=int)
+    bookings = booking_archive.query(request.args.get('date_from'), request.args.get('date_to'),
+                                     room_id=room_id, telegram_id=request.args.get('telegram_id'))
+    return stream_bookings_json(bookings, None)
 
-    return jsonify(room_statuses)
+@app.route('/api/telegram-metrics')
+@login_required
+def api_telegram_metrics():
+    """Per-method Telegram API latency metrics for this worker (admins only)"""
+    if is_admin(session.get('telegram_id')) == 0:
+        return jsonify({'error': 'Admin access required'}), 403
+    return jsonify(telegram_client.metrics())
 
 @app.route('/admin/recurring-booking/<int:room_id>')
 @login_required
@@ -980,7 +1161,7 @@ def recurring_booking(room_id):
         return redirect(url_for('index'))
 
     today = datetime.now().strftime('%Y-%m-%d')
-    return render_template('recurring_booking.html', room=room, today=today)
+    return render_template('recurring_booking.html', room=room, rooms=rooms, today=today)
 
 @app.route('/admin/recurring-booking/<int:room_id>', methods=['POST'])
 @login_required
@@ -994,13 +1175,24 @@ def process_recurring_booking(room_id):
         flash(get_translation(lang, 'admin_only', 'Admin access required'), 'error')
         return redirect(url_for('index'))
 
+    rooms = load_rooms()
+    room = next((r for r in rooms if r['id'] == room_id), None)
+
+    if not room:
+        flash(get_translation(lang, 'room_not_found', 'Room not found'), 'error')
+        return redirect(url_for('index'))
+
     # Get form data
     start_date = request.form.get('start_date')
     start_time = request.form.get('start_time')
     end_time = request.form.get('end_time')
     purpose = request.form.get('purpose', '')
     days_of_week = request.form.getlist('days_of_week')
-    weeks_count = int(request.form.get('weeks_count', 1))
+    weeks_count = min(int(request.form.get('weeks_count', 1)), 52)
+    # The room from the URL plus any extra rooms ticked on the form that exist
+    known_room_ids = {r['id'] for r in rooms}
+    room_ids = [room_id] + [int(r) for r in dict.fromkeys(request.form.getlist('room_ids'))
+                            if r.isdigit() and int(r) != room_id and int(r) in known_room_ids]
 
     # Validate form data
     if not all([start_date, start_time, end_time, days_of_week]):
@@ -1008,13 +1200,12 @@ def process_recurring_booking(room_id):
         return redirect(url_for('recurring_booking', room_id=room_id))
 
     # Get user data
-    users = load_users()
+    users = get_users()
     user_data = users.get(str(telegram_id))
 
     # Create base booking
     base_booking = {
         'room_id': room_id,
-        'room_name': next((r['name'] for r in load_rooms() if r['id'] == room_id), f'Room {room_id}'),
         'date': start_date,
         'start_time': start_time,
         'end_time': end_time,
@@ -1027,29 +1218,33 @@ def process_recurring_booking(room_id):
         'created_by_admin': admin_level
     }
 
-    # Convert day names to day offsets
+    # Convert day names to weekday numbers
     day_mapping = {
         'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3,
         'friday': 4, 'saturday': 5, 'sunday': 6
     }
-    day_offsets = [day_mapping[day] for day in days_of_week if day in day_mapping]
+    weekdays = {day_mapping[day] for day in days_of_week if day in day_mapping}
 
     # Create recurring bookings
-    new_bookings = create_recurring_bookings(base_booking, day_offsets, weeks_count)
+    with booking_repository.write_lock():
+        new_bookings, conflicts = plan_recurring_bookings(base_booking, room_ids, weekdays, weeks_count)
+        saved = add_bookings(new_bookings) if new_bookings else False
 
-    if new_bookings:
-        bookings = load_bookings()
-        bookings.extend(new_bookings)
+    if new_bookings and not saved:
+        flash(get_translation(lang, 'booking_error'), 'error')
+        return redirect(url_for('recurring_booking', room_id=room_id))
 
-        if save_bookings(bookings):
-            flash(f'{len(new_bookings)} повторяющихся бронирований создано успешно', 'success')
+    if new_bookings:
+        flash(f'{len(new_bookings)} повторяющихся бронирований создано успешно', 'success')
+        if not conflicts:
             return redirect(url_for('index'))
-        else:
-            flash(get_translation(lang, 'booking_error'), 'error')
     else:
         flash('Не удалось создать повторяющиеся бронирования. Проверьте доступность комнат.', 'warning')
 
-    return redirect(url_for('recurring_booking', room_id=room_id))
+    # Show the form again with the dates that clashed
+    return render_template('recurring_booking.html', room=room, rooms=rooms,
+                           today=datetime.now().strftime('%Y-%m-%d'),
+                           conflicts=conflicts, selected_room_ids=room_ids)
 
 # --- New Notification System ---
 
@@ -1072,13 +1267,11 @@ def manage_notifications():
 
     # Add regular notifications
     for notif in notifications:
-        notif['type'] = 'regular'
-        all_notifications.append(notif)
+        all_notifications.append(dict(notif, type='regular'))
 
     # Add recurring notifications
     for notif in recurring_notifications:
-        notif['type'] = 'recurring'
-        all_notifications.append(notif)
+        all_notifications.append(dict(notif, type='recurring'))
 
     # Sort by creation date
     all_notifications.sort(key=lambda x: x.get('created_at', ''), reverse=True)
@@ -1115,29 +1308,31 @@ def create_notification():
         flash(get_translation(lang, 'invalid_repeat_count', 'Количество повторений должно быть от 1 до 3'), 'error')
         return redirect(url_for('manage_notifications'))
 
-    users = load_users()
+    users = get_users()
     user_data = users.get(str(telegram_id))
 
     # Create notification
-    notifications = load_notifications()
-    new_notification = {
-        'id': len(notifications) + 1,
-        'message': message,
-        'days_of_week': days_of_week,
-        'notification_time': notification_time,
-        'weeks_count': weeks_count,
-        'repeat_count': repeat_count,
-        'repeat_interval': repeat_interval, # Store interval in minutes
-        'thread_id': thread_id if thread_id else None,
-        'created_by': user_data.get('name'),
-        'created_by_id': telegram_id,
-        'created_at': datetime.now().isoformat(),
-        'is_active': True
-    }
+    with notifications_store.locked():
+        notifications = load_notifications()
+        new_notification = {
+            'id': next_record_id('notifications', notifications_store),
+            'message': message,
+            'days_of_week': days_of_week,
+            'notification_time': notification_time,
+            'weeks_count': weeks_count,
+            'repeat_count': repeat_count,
+            'repeat_interval': repeat_interval, # Store interval in minutes
+            'thread_id': thread_id if thread_id else None,
+            'created_by': user_data.get('name'),
+            'created_by_id': telegram_id,
+            'created_at': datetime.now().isoformat(),
+            'is_active': True
+        }
 
-    notifications.append(new_notification)
+        notifications.append(new_notification)
+        saved = save_notifications(notifications)
 
-    if save_notifications(notifications):
+    if saved:
         flash(f'Уведомление создано! Будет отправляться в {notification_time} по дням: {", ".join(days_of_week)}', 'success')
     else:
         flash('Ошибка при создании уведомления', 'error')
@@ -1220,29 +1415,31 @@ def create_recurring_notification():
         flash('Заполните все обязательные поля', 'error')
         return redirect(url_for('manage_recurring_notifications'))
 
-    users = load_users()
+    users = get_users()
     user_data = users.get(str(telegram_id))
 
     # Create recurring notification
-    recurring_notifications = load_recurring_notifications()
-    new_recurring_notification = {
-        'id': len(recurring_notifications) + 1,
-        'message': message,
-        'days_of_week': days_of_week,
-        'notification_time': notification_time,
-        'weeks_count': weeks_count,
-        'repeat_count': repeat_count,
-        'repeat_interval_seconds': repeat_interval_seconds,
-        'created_by': user_data.get('name'),
-        'created_by_id': telegram_id,
-        'created_at': datetime.now().isoformat(),
-        'is_active': True,
-        'sent_count': 0
-    }
+    with recurring_notifications_store.locked():
+        recurring_notifications = load_recurring_notifications()
+        new_recurring_notification = {
+            'id': next_record_id('recurring_notifications', recurring_notifications_store),
+            'message': message,
+            'days_of_week': days_of_week,
+            'notification_time': notification_time,
+            'weeks_count': weeks_count,
+            'repeat_count': repeat_count,
+            'repeat_interval_seconds': repeat_interval_seconds,
+            'created_by': user_data.get('name'),
+            'created_by_id': telegram_id,
+            'created_at': datetime.now().isoformat(),
+            'is_active': True,
+            'sent_count': 0
+        }
 
-    recurring_notifications.append(new_recurring_notification)
+        recurring_notifications.append(new_recurring_notification)
+        saved = save_recurring_notifications(recurring_notifications)
 
-    if save_recurring_notifications(recurring_notifications):
+    if saved:
         interval_text = f"{repeat_interval} {interval_unit}"
         flash(f'Повторяющееся уведомление создано! Будет отправляться в {notification_time} с интервалом {interval_text}', 'success')
     else:
@@ -1261,10 +1458,12 @@ def delete_recurring_notification(notification_id):
         flash(get_translation(get_user_lang(), 'admin_only', 'Admin access required'), 'error')
         return redirect(url_for('index'))
 
-    recurring_notifications = load_recurring_notifications()
-    recurring_notifications = [n for n in recurring_notifications if n['id'] != notification_id]
+    with recurring_notifications_store.locked():
+        recurring_notifications = load_recurring_notifications()
+        recurring_notifications = [n for n in recurring_notifications if n['id'] != notification_id]
+        saved = save_recurring_notifications(recurring_notifications)
 
-    if save_recurring_notifications(recurring_notifications):
+    if saved:
         flash('Повторяющееся уведомление удалено', 'success')
     else:
         flash('Ошибка при удалении повторяющегося уведомления', 'error')
@@ -0,0 +1,109 @@
+import os
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
+from config import ARCHIVE_DIR, ARCHIVE_HORIZON_DAYS
+
+
+class BookingArchive:
+    """Old bookings kept out of the active store, one gzip JSONL file per month.
+
+    Files are named bookings-YYYY-MM.jsonl.gz after the booking date. Each
+    compaction run appends a new gzip member to the files it touches, which
+    gzip readers treat as one continuous stream.
+    """
+
+    PREFIX = 'bookings-'
+    SUFFIX = '.jsonl.gz'
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+
+    def _path(self, month):
+        return os.path.join(self.directory, f"{self.PREFIX}{month}{self.SUFFIX}")
+
+    def months(self):
+        """Sorted YYYY-MM months that have an archive file"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[len(self.PREFIX):-len(self.SUFFIX)] for name in names
+                      if name.startswith(self.PREFIX) and name.endswith(self.SUFFIX))
+
+    def append(self, bookings):
+        """Write bookings to the files of their months"""
+        by_month = {}
+        for booking in bookings:
+            by_month.setdefault(booking['date'][:7], []).append(booking)
+
+        os.makedirs(self.directory, exist_ok=True)
+        for month, month_bookings in by_month.items():
+            with gzip.open(self._path(month), 'at', encoding='utf-8') as f:
+                for booking in month_bookings:
+                    f.write(json.dumps(booking, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def query(self, date_from=None, date_to=None, room_id=None, telegram_id=None):
+        """Yield archived bookings in the date range (both ends inclusive), optionally for one room or user.
+
+        Only the files of the months in the range are opened.
+        """
+        for month in self.months():
+            if (date_from and month < date_from[:7]) or (date_to and month > date_to[:7]):
+                continue
+            seen_ids = set()
+            with gzip.open(self._path(month), 'rt', encoding='utf-8') as f:
+                for line in f:
+                    booking = json.loads(line)
+                    # A run interrupted before it removed the bookings from the store
+                    # archives them again on the next run
+                    if booking['id'] in seen_ids:
+                        continue
+                    seen_ids.add(booking['id'])
+                    if date_from and booking['date'] < date_from:
+                        continue
+                    if date_to and booking['date'] > date_to:
+                        continue
+                    if room_id is not None and booking['room_id'] != room_id:
+                        continue
+                    if telegram_id is not None and str(booking.get('telegram_id')) != str(telegram_id):
+                        continue
+                    yield booking
+
+
+def compact_bookings(repository, archive, horizon_days=ARCHIVE_HORIZON_DAYS, today=None):
+    """Move bookings dated more than horizon_days ago, and cancelled ones, into the archive.
+
+    Returns the number of bookings moved. Bookings are written to the
+    archive before they are deleted from the repository, so an interrupted
+    run loses nothing.
+    """
+    today = today or datetime.now().date()
+    cutoff = (today - timedelta(days=horizon_days)).strftime('%Y-%m-%d')
+
+    with repository.write_lock():
+        old = [b for b in repository.all()
+               if b['date'] < cutoff or b.get('status', 'confirmed') != 'confirmed']
+        if not old:
+            return 0
+        archive.append(old)
+        repository.delete_many([b['id'] for b in old])
+    return len(old)
+
+
+if __name__ == '__main__':
+    import argparse
+    from storage import create_booking_repository
+
+    parser = argparse.ArgumentParser(description="Move old bookings into monthly archive files")
+    parser.add_argument('--horizon', type=int, default=ARCHIVE_HORIZON_DAYS,
+                        help="Archive bookings dated more than this many days ago")
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    moved = compact_bookings(create_booking_repository(), BookingArchive(args.archive_dir), args.horizon)
+    logging.info(f"Archived {moved} bookings")
@@ -0,0 +1,413 @@
+"""Benchmarks for the booking hot paths.
+
+Builds a throw-away copy of the app with synthetic rooms, users and
+bookings, then measures:
+
+  * functions called directly (is_room_available, get_room_status,
+    plan_recurring_bookings),
+  * endpoints through the Flask test client,
+  * endpoints under concurrent HTTP load against a local gunicorn (--http).
+
+Telegram is replaced by a local stub server. Results are printed as JSON
+(or written to --output) with p50/p95/p99 latency in milliseconds and
+throughput per benchmark, so runs can be compared over time:
+
+    python benchmark.py --bookings 1000 100000 --http --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import math
+import random
+import shutil
+import socket
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_TELEGRAM_ID = 8090093417
+FEATURES = ['TV', 'WiFi', 'Whiteboard', 'Video Conferencing', 'Projector']
+SLOT_MINUTES = 60
+SLOTS_PER_DAY = 9
+
+
+# Telegram stub
+
+class _TelegramStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        method = self.path.rsplit('/', 1)[-1]
+        result = {'status': 'member'} if method == 'getChatMember' else {'message_id': 1}
+        body = json.dumps({'ok': True, 'result': result}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_telegram_stub():
+    """Start a local Bot API stub that accepts every call; returns its base URL"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _TelegramStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# Synthetic data
+
+def generate_dataset(workdir, bookings_count, rooms_count, users_count, database_url=None, seed=1):
+    """Write synthetic rooms, users and bookings into workdir/data.
+
+    Bookings fill one-hour slots between 9:00 and 18:00 with 70% occupancy,
+    spread over enough days around today that half of them are in the past.
+    """
+    rng = random.Random(seed)
+    data_dir = os.path.join(workdir, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+
+    rooms = [{
+        'id': room_id,
+        'name': f'Room {room_id}',
+        'capacity': rng.choice([4, 6, 8, 12, 20]),
+        'location': f'{room_id % 10 + 1} floor',
+        'features': sorted(rng.sample(FEATURES, rng.randint(1, len(FEATURES))))
+    } for room_id in range(1, rooms_count + 1)]
+
+    users = {str(BENCH_TELEGRAM_ID): {'name': 'Benchmark Admin', 'company': 'algapay'}}
+    for i in range(users_count):
+        users[str(1000000 + i)] = {'name': f'User {i}', 'company': 'algapay'}
+    user_ids = list(users)
+
+    days = max(1, math.ceil(bookings_count / (rooms_count * SLOTS_PER_DAY * 0.7)))
+    first_day = datetime.now().date() - timedelta(days=days // 2)
+    bookings = []
+    day = 0
+    while len(bookings) < bookings_count:
+        date = (first_day + timedelta(days=day)).strftime('%Y-%m-%d')
+        for room in rooms:
+            for slot in range(SLOTS_PER_DAY):
+                if len(bookings) >= bookings_count or rng.random() > 0.7:
+                    continue
+                start = 9 * 60 + slot * SLOT_MINUTES
+                bookings.append({
+                    'id': len(bookings) + 1,
+                    'room_id': room['id'],
+                    'room_name': room['name'],
+                    'date': date,
+                    'start_time': f"{start // 60:02d}:{start % 60:02d}",
+                    'end_time': f"{(start + SLOT_MINUTES) // 60:02d}:{(start + SLOT_MINUTES) % 60:02d}",
+                    'telegram_id': int(rng.choice(user_ids)),
+                    'user_name': 'Benchmark',
+                    'user_company': 'algapay',
+                    'purpose': '',
+                    'status': 'confirmed',
+                    'created_at': datetime.now().isoformat()
+                })
+        day += 1
+
+    with open(os.path.join(data_dir, 'rooms.json'), 'w', encoding='utf-8') as f:
+        json.dump(rooms, f)
+    with open(os.path.join(data_dir, 'users.json'), 'w', encoding='utf-8') as f:
+        json.dump(users, f)
+    with open(os.path.join(data_dir, 'admins.json'), 'w', encoding='utf-8') as f:
+        json.dump({str(BENCH_TELEGRAM_ID): {'telegram_id': BENCH_TELEGRAM_ID, 'level': 3,
+                                            'added_by': 'system', 'added_at': datetime.now().isoformat()}}, f)
+
+    if database_url and database_url.startswith('sqlite:///'):
+        sys.path.insert(0, workdir)
+        from storage import SqliteBookingRepository
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            SqliteBookingRepository(database_url[len('sqlite:///'):]).add_many(bookings)
+        finally:
+            os.chdir(cwd)
+    else:
+        with open(os.path.join(data_dir, 'bookings.json'), 'w', encoding='utf-8') as f:
+            json.dump(bookings, f)
+    return {'rooms': rooms_count, 'users': len(users), 'bookings': len(bookings), 'days': days}
+
+
+def prepare_workdir(bookings_count, rooms_count, users_count, database_url=None):
+    """Copy the app into a temporary directory and fill it with synthetic data"""
+    workdir = tempfile.mkdtemp(prefix='booking-bench-')
+    shutil.copytree(SOURCE_DIR, workdir, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns('data', '__pycache__', '*.whl', 'attached_assets'))
+    dataset = generate_dataset(workdir, bookings_count, rooms_count, users_count, database_url)
+    return workdir, dataset
+
+
+# Measurement
+
+def summarize(name, mode, latencies, elapsed, errors=0):
+    """Latency percentiles (ms) and throughput for one benchmark"""
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[max(0, math.ceil(len(latencies) * p) - 1)] * 1000, 3)
+
+    return {
+        'name': name,
+        'mode': mode,
+        'count': len(latencies),
+        'errors': errors,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def measure(name, mode, func, iterations):
+    """Call func(i) sequentially; func returns False for a failed call"""
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        if func(i) is False:
+            errors += 1
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(name, mode, latencies, time.perf_counter() - started, errors)
+
+
+def random_requests(rooms_count, seed=2):
+    """Deterministic generators of benchmark inputs"""
+    rng = random.Random(seed)
+    today = datetime.now().date()
+
+    def slot():
+        start = rng.randrange(9 * 60, 17 * 60, 15)
+        return f"{start // 60:02d}:{start % 60:02d}", f"{(start + 45) // 60:02d}:{(start + 45) % 60:02d}"
+
+    def room():
+        return rng.randint(1, rooms_count)
+
+    def date(days_ahead=14):
+        return (today + timedelta(days=rng.randint(1, days_ahead))).strftime('%Y-%m-%d')
+
+    return room, date, slot
+
+
+def endpoint_requests(rooms_count):
+    """(name, method, url factory, form factory) of the benchmarked endpoints"""
+    room, date, slot = random_requests(rooms_count)
+
+    def booking_form():
+        start_time, end_time = slot()
+        return {'date': date(60), 'start_time': start_time, 'end_time': end_time, 'purpose': 'benchmark'}
+
+    return [
+        ('GET /api/room-status', 'GET', lambda: '/api/room-status', None),
+        ('GET /api/schedule/<room_id>', 'GET', lambda: f'/api/schedule/{room()}?date={date()}', None),
+        ('GET /api/free-slots', 'GET', lambda: f'/api/free-slots?date_from={date()}&duration=60', None),
+        ('GET /', 'GET', lambda: '/', None),
+        ('POST /book/<room_id>', 'POST', lambda: f'/book/{room()}', booking_form),
+    ]
+
+
+def run_in_process(workdir, rooms_count, iterations):
+    """Benchmark functions and the test client inside this process; workdir must be prepared"""
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    import app as booking_app
+
+    results = []
+    room, date, slot = random_requests(rooms_count)
+
+    # The first call builds the booking index; report it separately
+    started = time.perf_counter()
+    booking_app.get_booking_index()
+    results.append(summarize('build booking index', 'function', [time.perf_counter() - started],
+                             time.perf_counter() - started))
+
+    def check_availability(i):
+        start_time, end_time = slot()
+        booking_app.is_room_available(room(), date(), start_time, end_time)
+
+    def plan_recurring(i):
+        start_time, end_time = slot()
+        base = {'room_id': room(), 'date': date(), 'start_time': start_time, 'end_time': end_time,
+                'status': 'confirmed'}
+        booking_app.plan_recurring_bookings(base, [base['room_id']], {0, 2, 4}, 52)
+
+    results.append(measure('is_room_available', 'function', check_availability, iterations))
+    results.append(measure('get_room_status', 'function', lambda i: booking_app.get_room_status(room()), iterations))
+    results.append(measure('plan_recurring_bookings (52 weeks)', 'function', plan_recurring,
+                           max(1, iterations // 10)))
+
+    client = booking_app.app.test_client()
+    with client.session_transaction() as session:
+        session['telegram_id'] = BENCH_TELEGRAM_ID
+        session['lang'] = 'ru'
+
+    for name, method, url, form in endpoint_requests(rooms_count):
+        def request_once(i, method=method, url=url, form=form):
+            response = client.open(url(), method=method, data=form() if form else None)
+            return response.status_code < 400
+
+        results.append(measure(name, 'test_client', request_once, iterations))
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_http_load(workdir, rooms_count, iterations, concurrency, workers, env):
+    """Benchmark endpoints under concurrent load against gunicorn running the prepared workdir"""
+    import requests
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '--threads', '4',
+         '-b', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+        cwd=workdir, env=env
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                requests.get(f'{base_url}/telegram-auth', timeout=1)
+                break
+            except requests.ConnectionError:
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+
+        cookie = _session_cookie(workdir, env)
+        results = []
+        for name, method, url, form in endpoint_requests(rooms_count):
+            latencies = []
+            errors = [0]
+            lock = threading.Lock()
+
+            def worker(count, method=method, url=url, form=form):
+                session = requests.Session()
+                session.cookies.set('session', cookie)
+                for _ in range(count):
+                    with lock:
+                        target, data = url(), form() if form else None
+                    started = time.perf_counter()
+                    try:
+                        response = session.request(method, base_url + target, data=data,
+                                                   allow_redirects=False, timeout=30)
+                        failed = response.status_code >= 400
+                    except requests.RequestException:
+                        failed = True
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        errors[0] += failed
+
+            per_thread = max(1, iterations // concurrency)
+            threads = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(concurrency)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            result = summarize(name, 'http', latencies, time.perf_counter() - started, errors[0])
+            result['concurrency'] = concurrency
+            results.append(result)
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def _session_cookie(workdir, env):
+    """Signed Flask session cookie for the benchmark admin, made with the server's secret"""
+    from flask import Flask
+    signer = Flask('benchmark')
+    signer.secret_key = env['SESSION_SECRET']
+    serializer = signer.session_interface.get_signing_serializer(signer)
+    return serializer.dumps({'telegram_id': BENCH_TELEGRAM_ID, 'lang': 'ru'})
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the booking hot paths")
+    parser.add_argument('--bookings', type=int, nargs='+', default=[1000, 10000],
+                        help="Dataset sizes to benchmark (number of bookings)")
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=200, help="Calls per benchmark")
+    parser.add_argument('--database-url', default='', help="e.g. sqlite:///data/bookings.db; JSON file by default")
+    parser.add_argument('--http', action='store_true', help="Also run concurrent HTTP load against gunicorn")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument('--output', help="Write the JSON report to this file instead of stdout")
+    parser.add_argument('--keep', action='store_true', help="Keep the temporary app copies")
+    parser.add_argument('--in-process', metavar='WORKDIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.in_process:
+        # Child run: one dataset per process so every size starts cold
+        results = run_in_process(args.in_process, args.rooms, args.iterations)
+        json.dump(results, sys.stdout)
+        return
+
+    env = dict(os.environ,
+               TELEGRAM_API_URL=start_telegram_stub(),
+               SESSION_SECRET='benchmark-secret',
+               NOTIFICATION_SCHEDULER='0',
+               # Measure the handlers, not the rate limiter
+               WEB_RATE_BURST='1000000000', WEB_GLOBAL_RATE_BURST='1000000000',
+               DATABASE_URL=args.database_url or 'url://...')
+
+    report = {
+        'meta': {
+            'started_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'storage': 'sqlite' if args.database_url.startswith('sqlite:///') else 'json',
+            'iterations': args.iterations,
+        },
+        'runs': []
+    }
+
+    for bookings_count in args.bookings:
+        workdir, dataset = prepare_workdir(bookings_count, args.rooms, args.users, args.database_url)
+        try:
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--in-process', workdir,
+                 '--rooms', str(args.rooms), '--iterations', str(args.iterations)],
+                env=env, capture_output=True, text=True, check=True
+            )
+            results = json.loads(child.stdout)
+            if args.http:
+                results += run_http_load(workdir, args.rooms, args.iterations, args.concurrency, args.workers, env)
+            report['runs'].append({'dataset': dataset, 'results': results})
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import json
+import bisect
+import heapq
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+
+
+def time_to_minutes(value):
+    """Convert a HH:MM string to minutes since midnight"""
+    hours, minutes = value.split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid time: {value}")
+    return hours * 60 + minutes
+
+
+def minutes_to_time(minutes):
+    """Convert minutes since midnight back to a HH:MM string"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def weekly_dates(start_date, weekdays, weeks_count):
+    """Dates falling on the given weekdays (0 is Monday) within weeks_count weeks from start_date"""
+    first_weekday = start_date.weekday()
+    return [start_date + timedelta(days=offset)
+            for offset in range(weeks_count * 7)
+            if (first_weekday + offset) % 7 in weekdays]
+
+
+class BookingIndex:
+    """In-memory index of confirmed bookings keyed by (room_id, date).
+
+    Each key holds a list of (start, end, booking_id) minute intervals kept
+    sorted by start, plus the running maximum of their end times. An overlap
+    query walks back from the insertion point of the requested end time and
+    stops as soon as no earlier interval can reach the requested start, so
+    it looks at a single interval when bookings do not overlap, and still
+    finds every conflict in data written before writes were serialized.
+
+    Every (room_id, date) key also has a digest of its bookings' content.
+    It only depends on the bookings, so every process holding the same data
+    computes the same digest, which makes it usable as an HTTP ETag.
+    """
+
+    def __init__(self, bookings=()):
+        self._lock = threading.RLock()
+        self._slots = {}
+        self._max_ends = {}
+        self._key_bookings = {}
+        self._key_digests = {}
+        for booking in bookings:
+            self.add(booking)
+
+    @staticmethod
+    def _entry(booking):
+        """Build the (key, interval) pair for a booking, or None if it is not indexed"""
+        if booking.get('status') != 'confirmed':
+            return None
+        try:
+            start = time_to_minutes(booking['start_time'])
+            end = time_to_minutes(booking['end_time'])
+        except (KeyError, ValueError, AttributeError) as e:
+            logging.error(f"Invalid time format in booking {booking.get('id')}: {e}")
+            return None
+        return (booking['room_id'], booking['date']), (start, end, booking.get('id'))
+
+    def add(self, booking):
+        """Add a confirmed booking to the index"""
+        entry = self._entry(booking)
+        if entry is None:
+            return
+        key, interval = entry
+        with self._lock:
+            intervals = self._slots.setdefault(key, [])
+            position = bisect.bisect_left(intervals, interval)
+            intervals.insert(position, interval)
+            self._update_max_ends(key, position)
+            self._key_bookings.setdefault(key, {})[interval] = booking
+            self._key_digests.pop(key, None)
+
+    def remove(self, booking):
+        """Remove a booking from the index using its stored room, date and times"""
+        entry = self._entry(booking)
+        if entry is None:
+            return
+        key, interval = entry
+        with self._lock:
+            intervals = self._slots.get(key)
+            if not intervals:
+                return
+            position = bisect.bisect_left(intervals, interval)
+            if position < len(intervals) and intervals[position] == interval:
+                del intervals[position]
+                self._update_max_ends(key, position)
+                self._key_bookings[key].pop(interval, None)
+                self._key_digests.pop(key, None)
+            if not intervals:
+                del self._slots[key]
+                del self._max_ends[key]
+                del self._key_bookings[key]
+
+    def replace(self, old_booking, new_booking):
+        """Move a booking from its old slot to its new one"""
+        with self._lock:
+            self.remove(old_booking)
+            self.add(new_booking)
+
+    def _update_max_ends(self, key, position):
+        """Recompute the running maximum of end times from position on"""
+        intervals = self._slots[key]
+        max_ends = self._max_ends.setdefault(key, [])
+        del max_ends[position:]
+        current = max_ends[-1] if max_ends else 0
+        for _, booking_end, _ in intervals[position:]:
+            current = max(current, booking_end)
+            max_ends.append(current)
+
+    @staticmethod
+    def _overlapping(intervals, max_ends, start, end, exclude_id=None):
+        """Id of an interval overlapping [start, end) in a sorted interval list, or None"""
+        # Intervals starting before the requested end are the only candidates;
+        # none before position can end after start once their running max does not
+        position = bisect.bisect_left(intervals, (end,))
+        while position > 0 and max_ends[position - 1] > start:
+            position -= 1
+            booking_start, booking_end, booking_id = intervals[position]
+            if booking_end > start and (exclude_id is None or booking_id != exclude_id):
+                return booking_id
+        return None
+
+    def find_conflict(self, room_id, date, start_time, end_time, exclude_id=None):
+        """Return the id of a booking overlapping the slot, or None if the slot is free"""
+        start = time_to_minutes(start_time)
+        end = time_to_minutes(end_time)
+
+        with self._lock:
+            intervals = self._slots.get((room_id, date))
+            if not intervals:
+                return None
+            return self._overlapping(intervals, self._max_ends[(room_id, date)], start, end, exclude_id)
+
+    def find_conflicts(self, room_ids, dates, start_time, end_time):
+        """Check one time slot on many rooms and dates at once.
+
+        Returns {(room_id, date): booking_id} for every combination that is
+        taken; combinations missing from the result are free.
+        """
+        start = time_to_minutes(start_time)
+        end = time_to_minutes(end_time)
+        conflicts = {}
+
+        with self._lock:
+            for room_id in room_ids:
+                for date in dates:
+                    intervals = self._slots.get((room_id, date))
+                    if not intervals:
+                        continue
+                    booking_id = self._overlapping(intervals, self._max_ends[(room_id, date)], start, end)
+                    if booking_id is not None:
+                        conflicts[(room_id, date)] = booking_id
+        return conflicts
+
+    def free_windows(self, room_ids, date, day_start, day_end, min_length):
+        """Free windows of several rooms on one date, found in a single sweep.
+
+        The bookings of all rooms are merged into one stream ordered by start
+        time; each booking closes the current free window of its room. Returns
+        (room_id, start, end) windows of at least min_length minutes within
+        [day_start, day_end), ordered by start time.
+        """
+        with self._lock:
+            streams = [[(start, end, room_id) for start, end, _ in self._slots.get((room_id, date), ())]
+                       for room_id in room_ids]
+
+        free_since = dict.fromkeys(room_ids, day_start)
+        windows = []
+        for start, end, room_id in heapq.merge(*streams):
+            since = free_since[room_id]
+            window_end = min(start, day_end)
+            if window_end - since >= min_length:
+                windows.append((room_id, since, window_end))
+            free_since[room_id] = max(since, end)
+        for room_id, since in free_since.items():
+            if day_end - since >= min_length:
+                windows.append((room_id, since, day_end))
+
+        windows.sort(key=lambda window: window[1])
+        return windows
+
+    def is_available(self, room_id, date, start_time, end_time, exclude_id=None):
+        """Check whether the slot is free"""
+        return self.find_conflict(room_id, date, start_time, end_time, exclude_id) is None
+
+    def key_digest(self, room_id, date):
+        """Digest of the confirmed bookings of a room on a date, the same in every process"""
+        key = (room_id, date)
+        with self._lock:
+            digest = self._key_digests.get(key)
+            if digest is None:
+                bookings = self._key_bookings.get(key, {})
+                content = [bookings[interval] for interval in self._slots.get(key, ()) if interval in bookings]
+                digest = hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()[:16]
+                self._key_digests[key] = digest
+            return digest
+
+    def intervals(self, room_id, date):
+        """Return the sorted (start, end, booking_id) intervals for a room on a date"""
+        with self._lock:
+            return list(self._slots.get((room_id, date), ()))
@@ -0,0 +1,246 @@
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from config import USERS_JSON_PATH
+from booking_index import BookingIndex, minutes_to_time, time_to_minutes
+from storage import JsonDocument, IdSequence, create_booking_repository, booking_sort_key
+
+# Booking data shared by the web app and the bot. Both processes read the same
+# files (or database) and each keeps its own index, rebuilt when the stored
+# bookings change.
+
+# Room status is computed in Kazakhstan time (UTC+5)
+KZ_TIMEZONE = timezone(timedelta(hours=5))
+
+# Data files are kept parsed in memory and reloaded only when they change on disk
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+rooms_store = JsonDocument(os.path.join(DATA_DIR, 'rooms.json'))
+booking_repository = create_booking_repository()
+users_store = JsonDocument(USERS_JSON_PATH, default=dict)
+id_sequence = IdSequence()
+
+# Working hours in minutes since midnight, as enforced by is_booking_time_valid
+WORKING_DAY_START = 9 * 60
+WORKING_DAY_END = 18 * 60
+WORKING_DAY_MIN_BOOKING = 15
+
+def next_booking_ids(count):
+    """Reserve ids for new bookings"""
+    return id_sequence.next_ids('bookings', count, booking_repository.max_id)
+
+# Index of confirmed bookings, rebuilt whenever the stored bookings change
+_booking_index = None
+_booking_index_version = None
+
+def current_booking_index():
+    """Get the booking index, rebuilding it if the bookings were changed elsewhere"""
+    global _booking_index, _booking_index_version
+    version = booking_repository.version
+    if _booking_index is None or version != _booking_index_version:
+        _booking_index = BookingIndex(booking_repository.all())
+        _booking_index_version = version
+    return _booking_index
+
+def apply_booking_changes(added=(), removed=()):
+    """Apply saved booking changes to the index instead of rebuilding it"""
+    global _booking_index_version
+    # Only patch the index if it matched the data the write was based on
+    version = booking_repository.version
+    if _booking_index is None or _booking_index_version != version - 1:
+        return
+    for booking in removed:
+        _booking_index.remove(booking)
+    for booking in added:
+        _booking_index.add(booking)
+    _booking_index_version = version
+
+def store_bookings(new_bookings):
+    """Store new bookings and add them to the index"""
+    try:
+        booking_repository.add_many(new_bookings)
+    except Exception as e:
+        logging.error(f"Error saving bookings: {e}")
+        return False
+    apply_booking_changes(added=new_bookings)
+    return True
+
+def new_booking(room, telegram_id, user_data, date, start_time, end_time, purpose=''):
+    """Build a confirmed booking record with a freshly reserved id"""
+    return {
+        'id': next_booking_ids(1)[0],
+        'room_id': room['id'],
+        'room_name': room['name'],
+        'date': date,
+        'start_time': start_time,
+        'end_time': end_time,
+        'telegram_id': telegram_id,
+        'user_name': user_data.get('name'),
+        'user_company': user_data.get('company'),
+        'purpose': purpose,
+        'status': 'confirmed',
+        'created_at': datetime.now().isoformat()
+    }
+
+def is_booking_time_valid(date, start_time, end_time):
+    """Validate booking time restrictions"""
+    now = datetime.now()
+
+    try:
+        # Parse booking date and time
+        booking_date = datetime.strptime(date, '%Y-%m-%d').date()
+        booking_start_time = datetime.strptime(start_time, '%H:%M').time()
+        booking_end_time = datetime.strptime(end_time, '%H:%M').time()
+    except ValueError:
+        return False, 'invalid_time'
+
+    # Create full datetime objects
+    booking_datetime = datetime.combine(booking_date, booking_start_time)
+
+    # More strict past time check - add 1 minute buffer to current time
+    current_time_with_buffer = now + timedelta(minutes=1)
+
+    # Check if booking is in the past (with buffer)
+    if booking_datetime <= current_time_with_buffer:
+        return False, 'cannot_book_past_time'
+
+    # Additional check for today's date
+    if booking_date == now.date():
+        current_time = now.time()
+        current_hour = now.hour
+        current_minute = now.minute
+        start_hour = booking_start_time.hour
+        start_minute = booking_start_time.minute
+
+        # If it's the same hour, check minutes more strictly
+        if start_hour == current_hour and start_minute <= current_minute + 1:
+            return False, 'cannot_book_past_time'
+        elif start_hour < current_hour:
+            return False, 'cannot_book_past_time'
+
+    # Check working hours (9:00 - 18:00)
+    start_hour = booking_start_time.hour
+    end_hour = booking_end_time.hour
+    start_minute = booking_start_time.minute
+    end_minute = booking_end_time.minute
+
+    # Start time must be between 9:00 and 17:45
+    if start_hour < 9 or (start_hour == 17 and start_minute > 45) or start_hour >= 18:
+        return False, 'outside_working_hours'
+
+    # End time must be between 9:15 and 18:00 (18:01 allowed for form validation)
+    if end_hour < 9 or (end_hour == 9 and end_minute < 15) or end_hour > 18 or (end_hour == 18 and end_minute > 1):
+        return False, 'outside_working_hours'
+
+    # End time must be after start time
+    if booking_end_time <= booking_start_time:
+        return False, 'invalid_time'
+
+    return True, None
+
+def room_statuses(index, room_ids):
+    """Get current status of several rooms from today's bookings in one pass.
+
+    For each room returns its status plus, when occupied, the end of the
+    current booking and the time the room actually becomes free (back-to-back
+    bookings are merged); when available, the start of its next booking today.
+    """
+    now = datetime.now(KZ_TIMEZONE)
+    current_date = now.strftime('%Y-%m-%d')
+    current_minutes = now.hour * 60 + now.minute
+
+    statuses = {}
+    for room_id in room_ids:
+        status = {'status': 'available', 'occupied_until': None, 'next_free_at': None, 'next_booking_at': None}
+        free_at = None
+
+        for start, end, _ in index.intervals(room_id, current_date):
+            if end <= current_minutes:
+                continue
+            if free_at is None:
+                # First booking that has not ended yet
+                if start > current_minutes:
+                    status['next_booking_at'] = minutes_to_time(start)
+                    break
+                status['status'] = 'occupied'
+                status['occupied_until'] = minutes_to_time(end)
+                free_at = end
+            elif start <= free_at:
+                free_at = max(free_at, end)
+            else:
+                break
+
+        if free_at is not None:
+            status['next_free_at'] = minutes_to_time(free_at)
+        statuses[room_id] = status
+
+    return statuses
+
+def free_slots(index, rooms, date_from, date_to, duration, limit):
+    """Earliest free windows of at least `duration` minutes in the rooms, within working hours.
+
+    Returns up to `limit` {'room_id', 'room_name', 'date', 'start', 'end'}
+    windows ordered by date and start time, none of them in the past in Kazakhstan time.
+    """
+    room_names = {room['id']: room['name'] for room in rooms}
+    room_ids = list(room_names)
+
+    now = datetime.now(KZ_TIMEZONE)
+    slots = []
+    day = max(date_from, now.date())
+    while day <= date_to and len(slots) < limit:
+        day_start = WORKING_DAY_START
+        if day == now.date():
+            # Bookings must start at least a minute from now; round up to a quarter hour
+            day_start = max(day_start, -(-(now.hour * 60 + now.minute + 2) // 15) * 15)
+        date_str = day.strftime('%Y-%m-%d')
+        for room_id, start, end in index.free_windows(room_ids, date_str, day_start, WORKING_DAY_END, duration):
+            slots.append({
+                'room_id': room_id,
+                'room_name': room_names[room_id],
+                'date': date_str,
+                'start': minutes_to_time(start),
+                'end': minutes_to_time(end)
+            })
+            if len(slots) >= limit:
+                break
+        day += timedelta(days=1)
+
+    return slots
+
+def book_first_free_slot(rooms, telegram_id, user_data, duration, days=7, purpose=''):
+    """Book the earliest free `duration` minutes in any of the rooms within `days` days, in Kazakhstan time.
+
+    Returns the stored booking, or None when nothing is free or it could
+    not be saved.
+    """
+    today = datetime.now(KZ_TIMEZONE).date()
+    # Search and save under the write lock so nobody takes the slot in between
+    with booking_repository.write_lock():
+        slots = free_slots(current_booking_index(), rooms, today, today + timedelta(days=days - 1), duration, 1)
+        if not slots:
+            return None
+        slot = slots[0]
+        room = next(room for room in rooms if room['id'] == slot['room_id'])
+        end_time = minutes_to_time(time_to_minutes(slot['start']) + duration)
+        booking = new_booking(room, telegram_id, user_data, slot['date'], slot['start'], end_time, purpose)
+        if not store_bookings([booking]):
+            return None
+    return booking
+
+def upcoming_bookings(telegram_id, limit=10):
+    """A user's confirmed bookings that have not ended yet, soonest first, in Kazakhstan time"""
+    now = datetime.now(KZ_TIMEZONE)
+    today = now.strftime('%Y-%m-%d')
+    current_time = now.strftime('%H:%M')
+
+    bookings = []
+    after = None
+    while len(bookings) < limit:
+        page = booking_repository.user_page(telegram_id, after=after, limit=limit, date_from=today)
+        if not page:
+            break
+        bookings.extend(booking for booking in page
+                        if booking.get('status') == 'confirmed'
+                        and (booking['date'] > today or booking['end_time'] > current_time))
+        after = booking_sort_key(page[-1])
+    return bookings[:limit]
@@ -1,13 +1,22 @@
 import os
 import logging
-import requests
 import asyncio
 import json
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, ConversationHandler, ContextTypes, filters
-from config import BOT_TOKEN, GROUP_ID
+import html
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo, InlineQueryResultArticle, InputTextMessageContent
+from telegram.error import BadRequest
+from telegram.ext import Application, ApplicationHandlerStop, TypeHandler, CommandHandler, CallbackQueryHandler, InlineQueryHandler, MessageHandler, ConversationHandler, ContextTypes, filters
+from config import (BOT_TOKEN, GROUP_ID, PENDING_DELETIONS_JSON_PATH, BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH,
+                    WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET, UPDATE_QUEUE_SIZE, UPDATE_CONCURRENCY, BOT_RATE_LIMIT, BOT_RATE_BURST,
+                    BOT_GLOBAL_RATE_LIMIT, BOT_GLOBAL_RATE_BURST, BOT_BOOKING_DURATION, BOT_BOOKING_SEARCH_DAYS)
 from admins import is_admin, add_admin, remove_admin, get_admins_list
-from datetime import datetime, timedelta, time
+from booking_service import (rooms_store, users_store, booking_repository, WORKING_DAY_MIN_BOOKING, WORKING_DAY_START,
+                             WORKING_DAY_END, current_booking_index, room_statuses, book_first_free_slot, upcoming_bookings)
+from membership import membership_cache, MEMBER_STATUSES
+from deletions import MessageDeletionScheduler
+from ratelimit import TokenBucketLimiter
+from update_processor import OrderedUpdateProcessor
+from webhook import allowed_update_types, generate_secret_token, serve_webhook
 
 # Conversation states
 ADD_ADMIN_ID, ADD_ADMIN_LEVEL = range(2)
@@ -19,30 +28,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def auto_delete_message(context, chat_id, message_id, delay=300):
-    """Auto delete message after specified delay (default 5 minutes)"""
-    try:
-        await asyncio.sleep(delay)
-        await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-        logger.info(f"Auto-deleted message {message_id} in chat {chat_id}")
-    except Exception as e:
-        logger.warning(f"Failed to auto-delete message {message_id}: {e}")
+# Bot replies are deleted after a delay by one background task
+message_deletions = MessageDeletionScheduler(PENDING_DELETIONS_JSON_PATH)
 
-async def check_group_membership(user_id):
+def auto_delete_message(message, delay=300):
+    """Auto delete message after specified delay (default 5 minutes)"""
+    message_deletions.schedule(message.chat_id, message.message_id, delay)
+
+# Every update passes a per-user token bucket before any handler runs
+update_limiter = TokenBucketLimiter(BOT_RATE_LIMIT, BOT_RATE_BURST, BOT_GLOBAL_RATE_LIMIT, BOT_GLOBAL_RATE_BURST)
+
+async def rate_limit_updates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Ignore updates from users over their rate limit"""
+    user = update.effective_user
+    if user is None:
+        return
+    # /start checks group membership and sends a greeting, so it takes a whole burst
+    is_start = update.message is not None and (update.message.text or '').startswith('/start')
+    retry_after = update_limiter.acquire(user.id, BOT_RATE_BURST if is_start else 1)
+    if retry_after:
+        logger.info(f"Update from user {user.id} ignored - rate limited for {retry_after:.1f}s")
+        raise ApplicationHandlerStop
+
+async def check_group_membership(bot, user_id):
     """Check if user is a member of the Telegram group"""
+    async def lookup(user_id):
+        try:
+            member = await bot.get_chat_member(chat_id=GROUP_ID, user_id=user_id)
+        except BadRequest:
+            # Telegram does not know this user in the group
+            return False
+        return member.status in MEMBER_STATUSES
+
     try:
-        url = f"https://api.telegram.org/bot{BOT_TOKEN}/getChatMember"
-        params = {
-            'chat_id': GROUP_ID,
-            'user_id': user_id
-        }
-        response = requests.get(url, params=params, timeout=10)
-        data = response.json()
-
-        if data.get('ok'):
-            status = data.get('result', {}).get('status')
-            return status in ['creator', 'administrator', 'member']
-        return False
+        return await membership_cache.check_async(user_id, lookup)
     except Exception as e:
         logger.error(f"Error checking Telegram group membership: {e}")
         return False
@@ -54,21 +73,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         user_id = user.id
         first_name = user.first_name or "Пользователь"
 
-        # Anti-spam protection - check if user sent /start recently
-        current_time = datetime.now()
-        user_data = context.user_data
-        last_start_time = user_data.get('last_start_time')
-
-        if last_start_time:
-            time_diff = (current_time - last_start_time).total_seconds()
-            if time_diff < 10:  # 10 seconds cooldown
-                logger.info(f"Start command ignored for user {user_id} - spam protection")
-                return
-
-        user_data['last_start_time'] = current_time
-
         # Check if user is a member of the group
-        is_member = await check_group_membership(user_id)
+        is_member = await check_group_membership(context.bot, user_id)
 
         if not is_member:
             access_denied_msg = (
@@ -79,12 +85,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             denied_message = await update.message.reply_text(access_denied_msg, parse_mode='HTML')
 
             # Schedule auto-deletion after 5 minutes
-            asyncio.create_task(auto_delete_message(
-                context, 
-                denied_message.chat_id, 
-                denied_message.message_id, 
-                300  # 5 minutes
-            ))
+            auto_delete_message(denied_message, 300)
 
             logger.warning(f"Access denied for user {user_id} ({first_name}) - not a group member")
             return
@@ -138,12 +139,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         )
 
         # Schedule auto-deletion after 5 minutes
-        asyncio.create_task(auto_delete_message(
-            context, 
-            sent_message.chat_id, 
-            sent_message.message_id, 
-            300  # 5 minutes
-        ))
+        auto_delete_message(sent_message, 300)
 
         logger.info(f"Access granted for user {user_id} ({first_name}) - group member")
 
@@ -155,12 +151,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 parse_mode='HTML'
             )
             # Auto-delete error message after 1 minute
-            asyncio.create_task(auto_delete_message(
-                context, 
-                error_message.chat_id, 
-                error_message.message_id, 
-                60
-            ))
+            auto_delete_message(error_message, 60)
         except Exception as inner_e:
             logger.error(f"Failed to send error message: {inner_e}")
 
@@ -170,6 +161,9 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "✨ <b>Бот системы бронирования Sapa Group</b> ✨\n\n"
         "📋 <b>Доступные команды:</b>\n"
         "/start - Запустить бота и получить доступ к веб-приложению\n"
+        "/free - Какие переговорные свободны сейчас\n"
+        "/book [минуты] - Забронировать ближайшее свободное время\n"
+        "/mine - Мои предстоящие бронирования\n"
         "/help - Показать это сообщение помощи\n\n"
         "💡 <b>Как пользоваться:</b>\n"
         "1. Нажмите /start\n"
@@ -181,12 +175,147 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     help_message = await update.message.reply_text(help_text, parse_mode='HTML')
 
     # Schedule auto-deletion after 5 minutes
-    asyncio.create_task(auto_delete_message(
-        context, 
-        help_message.chat_id, 
-        help_message.message_id, 
-        300  # 5 minutes
-    ))
+    auto_delete_message(help_message, 300)
+
+# Booking commands read and write the same data as the web app directly,
+# so common actions take one message instead of opening the web app
+def room_status_line(room, status):
+    """One line describing the current status of a room"""
+    name = html.escape(room['name'])
+    if status['status'] == 'occupied':
+        return f"🔴 <b>{name}</b> — занята до {status['next_free_at']}"
+    if status['next_booking_at']:
+        return f"🟢 <b>{name}</b> — свободна до {status['next_booking_at']}"
+    return f"🟢 <b>{name}</b> — свободна до конца дня"
+
+def booking_line(booking):
+    return f"📅 {booking['date']} ⏰ {booking['start_time']}–{booking['end_time']} — <b>{html.escape(booking.get('room_name', ''))}</b>"
+
+async def get_booking_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Registration data of a group member who may book, or None after telling the user why not"""
+    user_id = update.effective_user.id
+    if not await check_group_membership(context.bot, user_id):
+        reply = await update.effective_message.reply_text(
+            "🔒 Доступ к системе бронирования ограничен только для участников группы Sapa Group."
+        )
+        auto_delete_message(reply, 60)
+        return None
+
+    user_data = users_store.read().get(str(user_id))
+    if not user_data:
+        reply = await update.effective_message.reply_text(
+            "📝 Сначала зарегистрируйтесь в веб-приложении: нажмите /start"
+        )
+        auto_delete_message(reply, 60)
+        return None
+    return user_data
+
+def current_room_statuses(rooms):
+    """Statuses of the rooms from the booking index, which may have to be rebuilt from disk first"""
+    return room_statuses(current_booking_index(), [room['id'] for room in rooms])
+
+async def free_rooms_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle the /free command: current status of every room with buttons to book the free ones"""
+    if await get_booking_user(update, context) is None:
+        return
+
+    rooms = rooms_store.read()
+    statuses = await asyncio.to_thread(current_room_statuses, rooms)
+    lines = [room_status_line(room, statuses[room['id']]) for room in rooms]
+    keyboard = [[InlineKeyboardButton(f"📌 {room['name']}", callback_data=f"book_room_{room['id']}")]
+                for room in rooms if statuses[room['id']]['status'] == 'available']
+
+    free_message = await update.message.reply_text(
+        "🏢 <b>Переговорные сейчас:</b>\n\n" + "\n".join(lines or ["Нет переговорных"]),
+        reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None,
+        parse_mode='HTML'
+    )
+    auto_delete_message(free_message, 300)
+
+async def reply_with_booking(update: Update, context: ContextTypes.DEFAULT_TYPE, rooms, duration) -> None:
+    """Book the first free slot in the rooms for the user and report the result"""
+    user_data = await get_booking_user(update, context)
+    if user_data is None:
+        return
+
+    user_id = update.effective_user.id
+    booking = await asyncio.to_thread(book_first_free_slot, rooms, user_id, user_data, duration,
+                                      BOT_BOOKING_SEARCH_DAYS)
+    if booking is None:
+        await update.effective_message.reply_text(
+            f"😔 Нет свободного времени на {duration} мин. в ближайшие {BOT_BOOKING_SEARCH_DAYS} дн."
+        )
+        return
+
+    logger.info(f"Booking {booking['id']} created from the bot by user {user_id}")
+    await update.effective_message.reply_text(
+        f"✅ Забронировано!\n\n{booking_line(booking)}",
+        parse_mode='HTML'
+    )
+
+async def book_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /book [minutes]: book the earliest free slot in any room"""
+    duration = BOT_BOOKING_DURATION
+    if context.args:
+        try:
+            duration = int(context.args[0])
+        except ValueError:
+            duration = 0
+        if not WORKING_DAY_MIN_BOOKING <= duration <= WORKING_DAY_END - WORKING_DAY_START:
+            await update.message.reply_text(
+                f"❌ Укажите длительность в минутах, от {WORKING_DAY_MIN_BOOKING} до {WORKING_DAY_END - WORKING_DAY_START}"
+            )
+            return
+
+    await reply_with_booking(update, context, rooms_store.read(), duration)
+
+async def book_room_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle the booking buttons of /free: book the earliest free slot in that room"""
+    query = update.callback_query
+    await query.answer()
+
+    room_id = int(query.data.rsplit('_', 1)[1])
+    rooms = [room for room in rooms_store.read() if room['id'] == room_id]
+    if not rooms:
+        await query.message.reply_text("❌ Переговорная не найдена")
+        return
+    await reply_with_booking(update, context, rooms, BOT_BOOKING_DURATION)
+
+async def my_bookings_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle the /mine command: the user's upcoming bookings"""
+    if await get_booking_user(update, context) is None:
+        return
+
+    bookings = await asyncio.to_thread(upcoming_bookings, update.effective_user.id)
+    if bookings:
+        text = "🗓 <b>Ваши бронирования:</b>\n\n" + "\n".join(booking_line(booking) for booking in bookings)
+    else:
+        text = "🗓 У вас нет предстоящих бронирований"
+
+    mine_message = await update.message.reply_text(text, parse_mode='HTML')
+    auto_delete_message(mine_message, 300)
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answer inline queries with the current status of the rooms whose name matches the query"""
+    query = update.inline_query
+    if not await check_group_membership(context.bot, query.from_user.id):
+        await query.answer([], cache_time=60, is_personal=True)
+        return
+
+    search = query.query.strip().lower()
+    rooms = [room for room in rooms_store.read() if search in room['name'].lower()]
+    statuses = await asyncio.to_thread(current_room_statuses, rooms)
+    results = []
+    for room in rooms[:50]:
+        line = room_status_line(room, statuses[room['id']])
+        results.append(InlineQueryResultArticle(
+            id=str(room['id']),
+            title=room['name'],
+            description=line.split('— ', 1)[1],
+            input_message_content=InputTextMessageContent(line, parse_mode='HTML')
+        ))
+    # Statuses change with time, so Telegram may only reuse the answer briefly
+    await query.answer(results, cache_time=10, is_personal=True)
 
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle button callbacks"""
@@ -234,14 +363,8 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif query.data == "confirm_clear_system":
         if admin_level >= 3:
             try:
-                import json
-                import os
-
                 # Clear bookings
-                bookings_path = "data/bookings.json"
-                os.makedirs(os.path.dirname(bookings_path), exist_ok=True)
-                with open(bookings_path, 'w') as f:
-                    json.dump([], f, indent=2)
+                booking_repository.replace_all([])
 
                 await query.edit_message_text(
                     "✅ Система полностью очищена!\n\n"
@@ -387,11 +510,15 @@ async def add_admin_level(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     return ConversationHandler.END
 
-def main() -> None:
-    """Start the bot"""
-    # Create the Application
-    application = Application.builder().token(BOT_TOKEN).build()
+async def start_background_tasks(application: Application) -> None:
+    """Start tasks that run alongside update handling"""
+    message_deletions.start(application.bot)
+
+async def stop_background_tasks(application: Application) -> None:
+    await message_deletions.stop()
 
+def add_handlers(application):
+    """Register the bot's handlers on an application"""
     # Add conversation handler for admin management
     admin_conv_handler = ConversationHandler(
         entry_points=[CallbackQueryHandler(button_handler, pattern="^add_admin$")],
@@ -412,17 +539,42 @@ def main() -> None:
     )
 
     # Add handlers
+    application.add_handler(TypeHandler(Update, rate_limit_updates), group=-1)
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("free", free_rooms_command))
+    application.add_handler(CommandHandler("book", book_command))
+    application.add_handler(CommandHandler("mine", my_bookings_command))
+    application.add_handler(CallbackQueryHandler(book_room_callback, pattern=r"^book_room_\d+$"))
+    application.add_handler(InlineQueryHandler(inline_query_handler))
     application.add_handler(admin_conv_handler)
     application.add_handler(CallbackQueryHandler(button_handler))
 
+def main() -> None:
+    """Start the bot"""
+    # Create the Application
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+        .concurrent_updates(OrderedUpdateProcessor(UPDATE_CONCURRENCY))
+        .post_init(start_background_tasks)
+        .post_shutdown(stop_background_tasks)
+        .build()
+    )
+    add_handlers(application)
+
     # Log bot startup
     logger.info("Starting Sapa Room Booking Bot with enhanced design...")
 
     # Run the bot until the user presses Ctrl-C
     try:
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        if BOT_MODE == 'webhook':
+            secret_token = WEBHOOK_SECRET or generate_secret_token()
+            asyncio.run(serve_webhook(application, WEBHOOK_URL, WEBHOOK_PATH, secret_token,
+                                      WEBHOOK_LISTEN, WEBHOOK_PORT))
+        else:
+            application.run_polling(allowed_updates=allowed_update_types(application))
     except Exception as e:
         logger.error(f"Error running bot: {e}")
         raise
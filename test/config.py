@@ -6,6 +6,66 @@ GROUP_ID = -1002723413852
 THREAD_ID = 4  # Thread ID for notifications (as integer)
 NOTIFICATION_THREAD_ID = 4  # Thread ID for recurring notifications (as integer)
 
+# Telegram Bot API endpoint and HTTP connection pool settings
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", 10))
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", 10))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", 5))
+
+# Group membership checks are cached: members for MEMBERSHIP_CACHE_TTL seconds,
+# non-members only for MEMBERSHIP_NEGATIVE_TTL so new members get in quickly
+MEMBERSHIP_CACHE_TTL = int(os.getenv("MEMBERSHIP_CACHE_TTL", 600))
+MEMBERSHIP_NEGATIVE_TTL = int(os.getenv("MEMBERSHIP_NEGATIVE_TTL", 60))
+
+# The bot long-polls Telegram unless BOT_MODE is "webhook" (the default when
+# WEBHOOK_URL is set). Webhook mode serves WEBHOOK_PATH on WEBHOOK_LISTEN:WEBHOOK_PORT
+# and registers WEBHOOK_URL + WEBHOOK_PATH with Telegram; requests must carry
+# WEBHOOK_SECRET (a random one is used when empty). At most UPDATE_QUEUE_SIZE
+# updates wait for handlers in either mode.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+BOT_MODE = os.getenv("BOT_MODE", "webhook" if WEBHOOK_URL else "polling")
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", 256))
+
+# Updates are handled by up to UPDATE_CONCURRENCY handlers at once; the updates
+# of one user still run one after another
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", 16))
+
+# Token-bucket rate limits: each user gets RATE requests per second with bursts
+# of up to BURST, and all users together GLOBAL_RATE/GLOBAL_BURST. In the bot
+# /start takes a whole burst, i.e. one per BOT_RATE_BURST / BOT_RATE_LIMIT seconds.
+BOT_RATE_LIMIT = float(os.getenv("BOT_RATE_LIMIT", 1))
+BOT_RATE_BURST = int(os.getenv("BOT_RATE_BURST", 10))
+BOT_GLOBAL_RATE_LIMIT = float(os.getenv("BOT_GLOBAL_RATE_LIMIT", 30))
+BOT_GLOBAL_RATE_BURST = int(os.getenv("BOT_GLOBAL_RATE_BURST", 60))
+WEB_RATE_LIMIT = float(os.getenv("WEB_RATE_LIMIT", 5))
+WEB_RATE_BURST = int(os.getenv("WEB_RATE_BURST", 30))
+WEB_GLOBAL_RATE_LIMIT = float(os.getenv("WEB_GLOBAL_RATE_LIMIT", 200))
+WEB_GLOBAL_RATE_BURST = int(os.getenv("WEB_GLOBAL_RATE_BURST", 400))
+
+# Number of reverse proxies in front of the web app whose X-Forwarded-For is
+# trusted for the client address. Leave at 0 when clients connect directly,
+# otherwise anyone could pick their own address and rate-limit bucket.
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", 0))
+
+# /book and the booking buttons in /free take BOT_BOOKING_DURATION minutes in the
+# first free slot within BOT_BOOKING_SEARCH_DAYS days
+BOT_BOOKING_DURATION = int(os.getenv("BOT_BOOKING_DURATION", 60))
+BOT_BOOKING_SEARCH_DAYS = int(os.getenv("BOT_BOOKING_SEARCH_DAYS", 7))
+
+# The web app runs under gunicorn with GUNICORN_THREADS threads per worker (see
+# gunicorn.conf.py). Each open live-update stream holds one of them, so a worker
+# accepts at most MAX_EVENT_STREAMS streams; further pages poll instead.
+GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", 8))
+MAX_EVENT_STREAMS = int(os.getenv("MAX_EVENT_STREAMS", GUNICORN_THREADS // 2))
+
+# Send stored group notifications from the web app process; the scheduler can
+# run in several workers at once without sending a message twice
+NOTIFICATION_SCHEDULER_ENABLED = os.getenv("NOTIFICATION_SCHEDULER", "1") != "0"
+
 # Alternative way to load from environment variables:
 # BOT_TOKEN = os.getenv("BOT_TOKEN")
 # GROUP_ID = int(os.getenv("GROUP_ID"))
@@ -13,6 +73,15 @@ NOTIFICATION_THREAD_ID = 4  # Thread ID for recurring notifications (as integer)
 # JSON file paths
 USERS_JSON_PATH = "data/users.json"
 BOOKINGS_JSON_PATH = "data/bookings.json"
+SEQUENCES_JSON_PATH = "data/sequences.json"
+OUTBOX_JSONL_PATH = "data/outbox.jsonl"
+PENDING_DELETIONS_JSON_PATH = "data/pending_deletions.json"
+
+# Bookings older than ARCHIVE_HORIZON_DAYS are moved out of the active store into
+# monthly compressed files in ARCHIVE_DIR by `python archive.py`
+ARCHIVE_DIR = "data/archive"
+ARCHIVE_HORIZON_DAYS = int(os.getenv("ARCHIVE_HORIZON_DAYS", 30))
 
-# Database URL for future PostgreSQL migration
-DATABASE_URL = "url://..."  # on future
\ No newline at end of file
+# Database URL for bookings storage: "sqlite:///data/bookings.db" selects the
+# SQLite backend, anything else keeps bookings in BOOKINGS_JSON_PATH
+DATABASE_URL = os.getenv("DATABASE_URL", "url://...")
\ No newline at end of file
@@ -0,0 +1,123 @@
+import math
+import time
+import heapq
+import asyncio
+import logging
+from telegram.error import BadRequest, Forbidden, RetryAfter
+from storage import JsonDocument
+
+# Telegram refuses to delete messages older than 48 hours
+MAX_MESSAGE_AGE = 48 * 3600
+
+
+class MessageDeletionScheduler:
+    """Deletes bot messages after a delay from one asyncio task.
+
+    Pending deletions are (due time, chat_id, message_id) entries in a
+    min-heap, so a burst of replies costs three numbers each instead of a
+    sleeping task. The task wakes once per `tick` at most and deletes every
+    message that has fallen due since, spacing deleteMessage calls to stay
+    under `max_per_second`. The pending entries are saved to a JSON file
+    (at most once per tick) and reloaded on start, so messages scheduled
+    before a restart are still deleted.
+    """
+
+    def __init__(self, path, tick=1.0, max_per_second=20):
+        self.document = JsonDocument(path)
+        self.tick = tick
+        self.max_per_second = max_per_second
+        self._heap = []
+        self._dirty = False
+        self._wakeup = None
+        self._task = None
+
+    def schedule(self, chat_id, message_id, delay=300):
+        """Delete a message `delay` seconds from now"""
+        # Round up to whole ticks so deletions due close together run as one batch
+        due = math.ceil((time.time() + delay) / self.tick) * self.tick
+        wake = not self._dirty or not self._heap or due < self._heap[0][0]
+        heapq.heappush(self._heap, (due, chat_id, message_id))
+        self._dirty = True
+        if wake and self._wakeup is not None:
+            self._wakeup.set()
+
+    @property
+    def pending_count(self):
+        return len(self._heap)
+
+    def start(self, bot):
+        """Load saved entries and start the deletion task on the running event loop"""
+        try:
+            saved = self.document.read()
+            self._heap.extend(tuple(entry) for entry in saved)
+            heapq.heapify(self._heap)
+            if saved:
+                logging.info(f"Restored {len(saved)} pending message deletions")
+        except Exception as e:
+            logging.error(f"Error loading pending message deletions: {e}")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run(bot))
+
+    async def stop(self):
+        """Stop the task and save what is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._save()
+
+    def _save(self):
+        if not self._dirty:
+            return
+        try:
+            self.document.save([list(entry) for entry in self._heap])
+            self._dirty = False
+        except Exception as e:
+            logging.error(f"Error saving pending message deletions: {e}")
+
+    async def _run(self, bot):
+        while True:
+            self._save()
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+            if due:
+                self._dirty = True
+                await self._delete_batch(bot, due, now)
+                continue
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                continue
+            # Woken by new entries: collect the rest of the burst before saving
+            await asyncio.sleep(self.tick)
+
+    async def _delete_batch(self, bot, entries, now):
+        interval = 1 / self.max_per_second
+        for i, (due, chat_id, message_id) in enumerate(entries):
+            if now - due > MAX_MESSAGE_AGE:
+                continue
+            try:
+                await bot.delete_message(chat_id=chat_id, message_id=message_id)
+                logging.info(f"Auto-deleted message {message_id} in chat {chat_id}")
+            except RetryAfter as e:
+                # Put this and the remaining messages back and pause
+                logging.warning(f"Rate limited deleting messages, retrying in {e.retry_after}s")
+                for entry in entries[i:]:
+                    heapq.heappush(self._heap, (time.time() + e.retry_after, entry[1], entry[2]))
+                self._save()
+                await asyncio.sleep(e.retry_after)
+                return
+            except (BadRequest, Forbidden) as e:
+                # Already deleted by the user, or the bot lost access
+                logging.warning(f"Failed to auto-delete message {message_id}: {e}")
+            except Exception as e:
+                logging.warning(f"Failed to auto-delete message {message_id}: {e}")
+            await asyncio.sleep(interval)
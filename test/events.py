@@ -0,0 +1,111 @@
+import json
+import time
+import logging
+import queue
+import threading
+
+
+def format_sse(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class EventBroker:
+    """In-process publish/subscribe hub for Server-Sent Events streams.
+
+    Every subscriber gets its own bounded queue. A subscriber that falls too
+    far behind is sent a `resync` event instead of the dropped messages so
+    its page can reload the data once.
+
+    An optional ticker runs one background thread per process while anyone
+    is subscribed. It is used for work that has to happen periodically
+    regardless of writes in this process (room status transitions, changes
+    made by other workers), so its cost does not grow with the number of
+    open streams.
+
+    Each open stream occupies a server thread for as long as it is
+    connected, so at most `max_subscribers` are accepted per process; the
+    rest are turned away and their pages poll instead.
+    """
+
+    def __init__(self, max_queue_size=100, tick_interval=15, max_subscribers=4):
+        self.max_queue_size = max_queue_size
+        self.max_subscribers = max_subscribers
+        self.tick_interval = tick_interval
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ticker = None
+        self._ticker_thread = None
+
+    def subscribe(self):
+        """Register a new subscriber and return its queue, or None if max_subscribers are connected"""
+        subscription = queue.Queue(maxsize=self.max_queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._subscribers.add(subscription)
+            self._ensure_ticker()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        """Send an event to every subscriber without blocking"""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait((event, data))
+            except queue.Full:
+                # Replace the backlog with a single resync request
+                while True:
+                    try:
+                        subscription.get_nowait()
+                    except queue.Empty:
+                        break
+                subscription.put_nowait(('resync', {}))
+
+    def set_ticker(self, func):
+        """Register the function called every tick_interval seconds while there are subscribers"""
+        self._ticker = func
+
+    def _ensure_ticker(self):
+        if self._ticker is None or (self._ticker_thread and self._ticker_thread.is_alive()):
+            return
+        self._ticker_thread = threading.Thread(target=self._run_ticker, name='event-ticker', daemon=True)
+        self._ticker_thread.start()
+
+    def _run_ticker(self):
+        while True:
+            time.sleep(self.tick_interval)
+            with self._lock:
+                if not self._subscribers:
+                    self._ticker_thread = None
+                    return
+            try:
+                self._ticker()
+            except Exception as e:
+                logging.error(f"Error in event ticker: {e}")
+
+    def stream(self, subscription, initial_events=(), keepalive=25):
+        """Yield SSE-formatted messages for a subscription until the client disconnects"""
+        try:
+            yield "retry: 5000\n\n"
+            for event, data in initial_events:
+                yield format_sse(event, data)
+            while True:
+                try:
+                    event, data = subscription.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event, data)
+        finally:
+            self.unsubscribe(subscription)
@@ -0,0 +1,11 @@
+import os
+from config import GUNICORN_THREADS
+
+# Threaded workers, so live-update streams (at most MAX_EVENT_STREAMS per
+# worker) leave the other threads free for ordinary requests
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+worker_class = 'gthread'
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+threads = GUNICORN_THREADS
+# Streams send a keepalive every 25 seconds
+timeout = 60
@@ -0,0 +1,113 @@
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from config import MEMBERSHIP_CACHE_TTL, MEMBERSHIP_NEGATIVE_TTL
+
+# getChatMember statuses that grant access to the booking system
+MEMBER_STATUSES = ('creator', 'administrator', 'member')
+
+
+class MembershipCache:
+    """TTL cache of group membership checks.
+
+    Positive answers are kept for `ttl` seconds and negative ones only for
+    `negative_ttl`, so a user who has just joined the group is let in soon.
+    Concurrent checks for the same user share one lookup (single flight):
+    check() for threads in the Flask app, check_async() for the bot's event
+    loop. Lookups that fail with an exception are not cached.
+    """
+
+    def __init__(self, ttl=MEMBERSHIP_CACHE_TTL, negative_ttl=MEMBERSHIP_NEGATIVE_TTL, max_entries=10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_async = {}
+
+    def get(self, user_id):
+        """Return the cached result for a user, or None if unknown or expired"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            is_member, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            return is_member
+
+    def set(self, user_id, is_member):
+        ttl = self.ttl if is_member else self.negative_ttl
+        with self._lock:
+            self._entries[user_id] = (is_member, time.monotonic() + ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def check(self, user_id, lookup):
+        """Return membership from cache or from lookup(user_id), sharing in-flight lookups between threads"""
+        cached = self.get(user_id)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            waiter = self._inflight.get(user_id)
+            leader = waiter is None
+            if leader:
+                waiter = self._inflight[user_id] = {'done': threading.Event(), 'result': None, 'error': None}
+
+        if not leader:
+            waiter['done'].wait()
+            if waiter['error'] is not None:
+                raise waiter['error']
+            return waiter['result']
+
+        try:
+            waiter['result'] = lookup(user_id)
+            self.set(user_id, waiter['result'])
+            return waiter['result']
+        except Exception as e:
+            waiter['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[user_id]
+            waiter['done'].set()
+
+    async def check_async(self, user_id, lookup):
+        """Async variant of check(); lookup is a coroutine function"""
+        cached = self.get(user_id)
+        if cached is not None:
+            return cached
+
+        future = self._inflight_async.get(user_id)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight_async[user_id] = future
+        try:
+            result = await lookup(user_id)
+            self.set(user_id, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting
+            future.exception()
+            raise
+        finally:
+            # If the lookup was cancelled, cancel the waiters too instead of leaving them hanging
+            if not future.done():
+                future.cancel()
+            del self._inflight_async[user_id]
+
+
+membership_cache = MembershipCache()
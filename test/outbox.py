@@ -0,0 +1,224 @@
+import os
+import json
+import fcntl
+import queue
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+
+class NotificationOutbox:
+    """Persistent outbox for Telegram messages with background delivery.
+
+    enqueue() appends one line to a JSONL journal and hands the message to
+    a pool of worker threads, so request handlers never wait for Telegram.
+    Workers retry transient failures with exponential backoff and honour
+    `retry_after` from 429 responses. Every state change is appended to the
+    journal, which lets a restarted process pick up messages that were still
+    pending; each pending message records the pid of the process delivering
+    it so several gunicorn workers never send the same message twice.
+    """
+
+    MAX_RECENT = 1000
+    COMPACT_THRESHOLD = 5000
+
+    def __init__(self, path, send_func, id_allocator, workers=2, max_attempts=5, max_backoff=300):
+        self.path = path
+        self.send_func = send_func
+        self.id_allocator = id_allocator
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._recent = OrderedDict()
+        self._started_pid = None
+
+    # Journal
+
+    @contextmanager
+    def _journal_lock(self):
+        """Exclusive lock on the journal, held in a separate file so compaction can replace it"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _append(self, records):
+        """Append state records to the journal"""
+        with self._journal_lock():
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _replay(self, lines):
+        """Return the latest state of every message in the journal by id"""
+        states = OrderedDict()
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logging.warning(f"Skipping corrupt outbox journal line: {line!r}")
+                continue
+            states.setdefault(record['id'], {}).update(record)
+        return states
+
+    def _remember(self, state):
+        with self._lock:
+            self._recent[state['id']] = state
+            self._recent.move_to_end(state['id'])
+            while len(self._recent) > self.MAX_RECENT:
+                self._recent.popitem(last=False)
+
+    def _record(self, message, **changes):
+        """Update a message's state in memory and in the journal"""
+        changes['updated_at'] = datetime.now().isoformat()
+        message.update(changes)
+        self._remember(dict(message))
+        self._append([dict(changes, id=message['id'])])
+
+    # Workers
+
+    def start(self):
+        """Start the delivery workers and recover messages left pending by dead processes"""
+        with self._lock:
+            # Threads do not survive fork, so restart them in each new process
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'outbox-worker-{i}', daemon=True).start()
+        try:
+            self._recover()
+        except Exception as e:
+            logging.error(f"Error recovering outbox: {e}")
+
+    def _recover(self):
+        if not os.path.exists(self.path):
+            return
+        with self._journal_lock():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+            states = self._replay(lines)
+            claimed = []
+            for state in states.values():
+                if state['status'] in ('pending', 'retrying') and not _process_alive(state.get('owner')):
+                    state['owner'] = os.getpid()
+                    claimed.append(state)
+
+            if len(lines) > self.COMPACT_THRESHOLD:
+                self._compact(states)
+            elif claimed:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    for state in claimed:
+                        f.write(json.dumps({'id': state['id'], 'owner': state['owner']}) + '\n')
+
+        for state in claimed:
+            logging.info(f"Resuming outbox message {state['id']} to {state['chat_id']}")
+            self._remember(dict(state))
+            self._queue.put(state)
+
+    def _compact(self, states):
+        """Rewrite the journal with unfinished messages and the most recent finished ones"""
+        finished = [s for s in states.values() if s['status'] in ('sent', 'failed')][-self.MAX_RECENT:]
+        keep = [s for s in states.values() if s['status'] not in ('sent', 'failed')] + finished
+        directory = os.path.dirname(self.path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='outbox.', suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as tmp:
+            for state in keep:
+                tmp.write(json.dumps(state, ensure_ascii=False) + '\n')
+        os.replace(tmp_path, self.path)
+
+    def _work(self):
+        while True:
+            message = self._queue.get()
+            try:
+                self._deliver(message)
+            except Exception as e:
+                logging.error(f"Unexpected error delivering outbox message {message.get('id')}: {e}")
+
+    def _deliver(self, message):
+        attempts = message.get('attempts', 0) + 1
+        retry_after = None
+        try:
+            result = self.send_func(message['chat_id'], message['text'], **message.get('options', {}))
+        except Exception as e:
+            # Network errors and timeouts are always worth retrying
+            result = {'ok': False, 'description': str(e)}
+            retryable = True
+        else:
+            error_code = result.get('error_code')
+            retry_after = (result.get('parameters') or {}).get('retry_after')
+            retryable = error_code is None or error_code == 429 or error_code >= 500
+
+        if result.get('ok'):
+            self._record(message, status='sent', attempts=attempts, error=None)
+            return
+
+        error = result.get('description', 'Unknown error')
+        if not retryable or attempts >= self.max_attempts:
+            logging.error(f"Giving up on outbox message {message['id']} after {attempts} attempts: {error}")
+            self._record(message, status='failed', attempts=attempts, error=error)
+            return
+
+        delay = retry_after if retry_after else min(2 ** attempts, self.max_backoff)
+        logging.warning(f"Outbox message {message['id']} failed ({error}), retrying in {delay}s")
+        self._record(message, status='retrying', attempts=attempts, error=error)
+        timer = threading.Timer(delay, self._queue.put, args=(message,))
+        timer.daemon = True
+        timer.start()
+
+    # Public API
+
+    def enqueue(self, chat_id, text, **options):
+        """Queue a message for delivery and return its id"""
+        self.start()
+        message = {
+            'id': self.id_allocator(),
+            'chat_id': chat_id,
+            'text': text,
+            'options': options,
+            'status': 'pending',
+            'attempts': 0,
+            'owner': os.getpid(),
+            'created_at': datetime.now().isoformat()
+        }
+        self._append([message])
+        self._remember(dict(message))
+        self._queue.put(message)
+        return message['id']
+
+    def status(self, message_id):
+        """Return the latest known state of a message, or None"""
+        with self._lock:
+            state = self._recent.get(message_id)
+        if state is not None:
+            return dict(state)
+        # Sent by another process or before a restart
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return self._replay(f).get(message_id)
+        except FileNotFoundError:
+            return None
+
+
+def _process_alive(pid):
+    """Check whether a process with this pid is still running"""
+    if not pid:
+        return False
+    if pid == os.getpid():
+        # Our own pid in the journal is left over from an earlier run
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
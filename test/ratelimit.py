@@ -0,0 +1,59 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """Per-key and global token buckets kept in memory.
+
+    Every key (a user or client address) gets a bucket of `burst` tokens
+    refilled at `rate` tokens per second, and all keys share one more bucket
+    of `global_burst` tokens refilled at `global_rate`. A request is allowed
+    only when both buckets hold enough tokens, and only then are tokens
+    taken. Buckets of the least recently seen keys are dropped beyond
+    `max_keys`; a dropped key simply starts again with a full bucket.
+
+    Counters are per process, so with several workers each one enforces the
+    limits on its own share of the traffic.
+    """
+
+    def __init__(self, rate, burst, global_rate, global_burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._global = (global_burst, time.monotonic())
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _refill(bucket, rate, burst, now):
+        tokens, updated_at = bucket
+        return min(burst, tokens + (now - updated_at) * rate)
+
+    @staticmethod
+    def _wait(tokens, cost, rate):
+        """Seconds until `tokens` grows to `cost`"""
+        return 0 if tokens >= cost else (cost - tokens) / rate
+
+    def acquire(self, key, cost=1):
+        """Take `cost` tokens for a key. Returns 0 if allowed, otherwise the seconds to wait before retrying."""
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = self.burst if bucket is None else self._refill(bucket, self.rate, self.burst, now)
+            global_tokens = self._refill(self._global, self.global_rate, self.global_burst, now)
+
+            retry_after = max(self._wait(tokens, cost, self.rate),
+                              self._wait(global_tokens, min(cost, self.global_burst), self.global_rate))
+            if retry_after == 0:
+                tokens -= cost
+                global_tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            self._global = (global_tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return retry_after
@@ -0,0 +1,215 @@
+import os
+import heapq
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def repeat_interval_seconds(record):
+    """Spacing between the repeats of one occurrence; recurring records store seconds, others minutes"""
+    if 'repeat_interval_seconds' in record:
+        return int(record['repeat_interval_seconds'])
+    return int(record.get('repeat_interval', 1)) * 60
+
+
+def next_fire_time(record, after, tz):
+    """Return the first send time of a notification record later than `after`, or None.
+
+    A record fires on each of its days_of_week at notification_time, for
+    weeks_count weeks starting on the day it was created, and every firing
+    is repeated repeat_count times, repeat_interval apart.
+    """
+    if not record.get('is_active', True):
+        return None
+    try:
+        hour, minute = (int(part) for part in record['notification_time'].split(':')[:2])
+        days = {WEEKDAYS.index(day) if isinstance(day, str) else int(day) % 7
+                for day in record.get('days_of_week', [])}
+        created_at = datetime.fromisoformat(record['created_at']).astimezone(tz)
+        interval = timedelta(seconds=repeat_interval_seconds(record))
+        repeat_count = max(1, int(record.get('repeat_count', 1)))
+        weeks_count = max(1, int(record.get('weeks_count', 1)))
+    except (KeyError, ValueError, TypeError) as e:
+        logging.warning(f"Cannot schedule notification {record.get('id')}: {e}")
+        return None
+
+    after = max(after, created_at - timedelta(microseconds=1))
+    first_day = created_at.date()
+    # Repeats of an earlier day may still be pending, so start looking a bit before `after`
+    lookback = (interval * (repeat_count - 1)).days + 1
+    day = max(first_day, after.date() - timedelta(days=lookback))
+    end_day = first_day + timedelta(weeks=weeks_count)
+
+    candidates = []
+    while day < end_day:
+        if candidates and min(candidates).date() < day:
+            # Later days cannot produce anything earlier
+            break
+        if day.weekday() in days:
+            base = datetime(day.year, day.month, day.day, hour, minute, tzinfo=tz)
+            for repeat in range(repeat_count):
+                fire_at = base + interval * repeat
+                if fire_at > after:
+                    candidates.append(fire_at)
+                    break
+        day += timedelta(days=1)
+    return min(candidates) if candidates else None
+
+
+class NotificationScheduler:
+    """Sends stored notifications on time from one background thread.
+
+    Every active record is compiled into its next send time, kept in a
+    min-heap, and the thread sleeps until the earliest one is due. When a
+    notifications file changes only the records that differ from the last
+    version seen are recompiled; stale heap entries are skipped when popped.
+    Changes made in this process call wake(); changes made by other
+    processes are noticed after at most `recheck_interval` seconds, which
+    only costs a stat() of each file.
+
+    Before a message is sent its record is updated with `last_sent_at` and
+    `sent_count` under the file's lock. A send time that is not later than
+    `last_sent_at` is never sent again, so neither a restart nor a second
+    process running the scheduler can deliver the same message twice. Send
+    times missed by more than `misfire_grace` seconds (e.g. while the
+    process was down) are skipped.
+
+    `sources` maps a name to (JsonDocument, send function); the send
+    function receives the record and returns True on success.
+    """
+
+    def __init__(self, sources, tz, recheck_interval=60, misfire_grace=300):
+        self.sources = sources
+        self.tz = tz
+        self.recheck_interval = recheck_interval
+        self.misfire_grace = misfire_grace
+        self._heap = []
+        self._entries = {}
+        self._versions = {}
+        self._condition = threading.Condition()
+        self._woken = False
+        self._started_pid = None
+
+    def start(self):
+        """Start the scheduler thread once per process"""
+        with self._condition:
+            # Threads do not survive fork, so restart in each new process
+            if self._started_pid == os.getpid():
+                return
+            self._started_pid = os.getpid()
+            self._heap = []
+            self._entries = {}
+            self._versions = {}
+        threading.Thread(target=self._run, name='notification-scheduler', daemon=True).start()
+
+    def wake(self):
+        """Recheck the notification files now instead of at the next deadline"""
+        with self._condition:
+            self._woken = True
+            self._condition.notify()
+
+    def pending(self):
+        """Next send time of every scheduled record as {(source, id): datetime}"""
+        with self._condition:
+            return {key: datetime.fromtimestamp(fire_ts, self.tz) for key, (fire_ts, _) in self._entries.items()}
+
+    def _run(self):
+        while True:
+            try:
+                self._refresh()
+                self._fire_due()
+            except Exception as e:
+                logging.error(f"Error in notification scheduler: {e}")
+            with self._condition:
+                if not self._woken:
+                    timeout = self.recheck_interval
+                    if self._heap:
+                        timeout = min(timeout, max(0, self._heap[0][0] - time.time()))
+                    self._condition.wait(timeout)
+                self._woken = False
+
+    def _earliest_after(self, record):
+        now = datetime.now(self.tz)
+        after = now - timedelta(seconds=self.misfire_grace)
+        if record.get('last_sent_at'):
+            after = max(after, datetime.fromisoformat(record['last_sent_at']))
+        return next_fire_time(record, after, self.tz)
+
+    def _schedule(self, key, record):
+        """(Re)compute the next send time of one record"""
+        fire_at = self._earliest_after(record)
+        with self._condition:
+            if fire_at is None:
+                self._entries.pop(key, None)
+                return
+            fire_ts = fire_at.timestamp()
+            self._entries[key] = (fire_ts, record)
+            heapq.heappush(self._heap, (fire_ts, key))
+
+    def _refresh(self):
+        """Recompile records that changed since the files were last read"""
+        for name, (store, _) in self.sources.items():
+            records = store.read()
+            if self._versions.get(name) == store.version:
+                continue
+            self._versions[name] = store.version
+
+            current = {record['id']: record for record in records}
+            with self._condition:
+                removed = [key for key in self._entries if key[0] == name and key[1] not in current]
+                for key in removed:
+                    del self._entries[key]
+            for record_id, record in current.items():
+                key = (name, record_id)
+                entry = self._entries.get(key)
+                if entry is None or entry[1] != record:
+                    self._schedule(key, record)
+
+    def _fire_due(self):
+        while True:
+            with self._condition:
+                if not self._heap or self._heap[0][0] > time.time():
+                    return
+                fire_ts, key = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is None or entry[0] != fire_ts:
+                    # Superseded by a recomputed entry
+                    continue
+
+            name, record_id = key
+            fire_at = datetime.fromtimestamp(fire_ts, self.tz)
+            record = self._claim(name, record_id, fire_at)
+            if record is None:
+                # Deleted, deactivated or already sent by another process
+                self._versions.pop(name, None)
+                continue
+
+            logging.info(f"Sending {name} {record_id} scheduled for {fire_at.isoformat()}")
+            try:
+                if not self.sources[name][1](record):
+                    logging.error(f"Failed to send {name} {record_id}")
+            except Exception as e:
+                logging.error(f"Error sending {name} {record_id}: {e}")
+            self._schedule(key, record)
+
+    def _claim(self, name, record_id, fire_at):
+        """Mark a send time as sent in the record; returns the updated record, or None if it must not be sent"""
+        store = self.sources[name][0]
+        with store.locked():
+            records = store.load()
+            for i, record in enumerate(records):
+                if record['id'] == record_id:
+                    break
+            else:
+                return None
+            if not record.get('is_active', True):
+                return None
+            if record.get('last_sent_at') and datetime.fromisoformat(record['last_sent_at']) >= fire_at:
+                return None
+            records[i] = dict(record, last_sent_at=fire_at.isoformat(),
+                              sent_count=record.get('sent_count', 0) + 1)
+            store.save(records)
+            return records[i]
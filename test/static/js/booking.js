@@ -380,6 +380,31 @@ function showError(element, message = 'An error occurred') {
     `;
 }
 
+/**
+ * Subscribe to live booking events pushed by the server (Server-Sent Events).
+ * `handlers` maps event names (room_status, booking_created, booking_updated,
+ * booking_deleted, bookings_changed, resync) to callbacks receiving the parsed data.
+ * `onConnectionChange(connected)` lets pages fall back to polling while the
+ * stream is down. Returns null if the browser has no EventSource support.
+ */
+function subscribeToBookingEvents(handlers, onConnectionChange = () => {}) {
+    if (!window.EventSource) {
+        return null;
+    }
+
+    const source = new EventSource('/api/events');
+    Object.keys(handlers).forEach(eventName => {
+        source.addEventListener(eventName, event => {
+            handlers[eventName](JSON.parse(event.data));
+        });
+    });
+    source.onopen = () => onConnectionChange(true);
+    source.onerror = () => onConnectionChange(false);
+
+    window.addEventListener('beforeunload', () => source.close());
+    return source;
+}
+
 /**
  * Auto-dismiss alerts after 5 seconds
  */
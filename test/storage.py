@@ -0,0 +1,652 @@
+import os
+import json
+import fcntl
+import bisect
+import base64
+import logging
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from config import BOOKINGS_JSON_PATH, DATABASE_URL, SEQUENCES_JSON_PATH
+
+
+class JsonDocument:
+    """A JSON data file kept parsed in memory.
+
+    The cached document is revalidated against the file's mtime and size on
+    every read, so it is only reparsed when another process (e.g. bot.py)
+    has changed the file. `version` increases whenever the content changes,
+    which lets derived structures such as the booking index know when they
+    are stale.
+
+    Writes go to a temporary file that replaces the original atomically, so
+    readers never see a half-written document and need no lock. Writers that
+    read, modify and save should do so inside locked(), which holds an
+    exclusive flock shared by all processes using the same file.
+    """
+
+    def __init__(self, path, default=list, **dump_kwargs):
+        self.path = path
+        self.default = default
+        self.dump_kwargs = dump_kwargs or {'indent': 2}
+        self.version = 0
+        self._lock = threading.RLock()
+        self._write_lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+        self._data = None
+        self._stamp = None
+        self._loaded = False
+
+    def _file_stamp(self):
+        """Return (mtime, size, inode) of the file, or None if it does not exist"""
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except FileNotFoundError:
+            return None
+
+    def read(self):
+        """Return the cached document, reparsing the file only if it changed.
+
+        The returned object is shared between callers and must not be mutated;
+        use load() to get a copy that can be modified and saved.
+        """
+        stamp = self._file_stamp()
+        with self._lock:
+            if self._loaded and stamp == self._stamp:
+                return self._data
+            if stamp is None:
+                logging.debug(f"{self.path} not found, using empty document")
+                data = self.default()
+            else:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            self._data = data
+            self._stamp = stamp
+            self._loaded = True
+            self.version += 1
+            return data
+
+    def load(self):
+        """Return a shallow copy of the document that callers may modify"""
+        return self.read().copy()
+
+    @contextmanager
+    def locked(self):
+        """Hold the exclusive write lock for a read-modify-write sequence.
+
+        The lock is re-entrant within a process, so save() can be called
+        while it is held.
+        """
+        with self._write_lock:
+            if self._lock_depth == 0:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._lock_file = open(self.path + '.lock', 'a')
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _write(self, data):
+        """Write data to a temporary file and atomically move it into place"""
+        directory = os.path.dirname(self.path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path) + '.', suffix='.tmp')
+        try:
+            os.fchmod(fd, 0o644)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, **self.dump_kwargs)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def save(self, data):
+        """Write the document to disk and update the cache"""
+        with self.locked():
+            self._write(data)
+            with self._lock:
+                self._data = data.copy()
+                self._stamp = self._file_stamp()
+                self._loaded = True
+                self.version += 1
+        return True
+
+
+class IdSequence:
+    """Persistent counters that hand out unique, increasing record ids.
+
+    Counters live in one small JSON file and are advanced under its flock, so
+    ids stay unique across processes without loading the records themselves.
+    A counter that does not exist yet starts after the highest id returned by
+    `start_after`, so existing data keeps its ids.
+    """
+
+    def __init__(self, path=SEQUENCES_JSON_PATH):
+        self.document = JsonDocument(path, default=dict)
+
+    def next_ids(self, name, count, start_after=None):
+        """Reserve `count` consecutive ids and return them as a range"""
+        with self.document.locked():
+            counters = self.document.load()
+            current = counters.get(name)
+            if current is None:
+                current = start_after() if start_after else 0
+            counters[name] = current + count
+            self.document.save(counters)
+        return range(current + 1, current + count + 1)
+
+    def next_id(self, name, start_after=None):
+        """Reserve a single id"""
+        return self.next_ids(name, 1, start_after)[0]
+
+
+def booking_sort_key(booking):
+    """Order of paginated booking lists: date, start time, then id"""
+    return (booking['date'], booking['start_time'], booking['id'])
+
+
+def encode_cursor(booking):
+    """Opaque pagination cursor pointing just past a booking"""
+    raw = json.dumps(list(booking_sort_key(booking)))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into a sort key; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        date, start_time, booking_id = json.loads(raw)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return (str(date), str(start_time), int(booking_id))
+
+
+def _page_of(keys, entries, after, limit, date_from, date_to, descending):
+    """Slice a key-sorted list for one page; see JsonBookingRepository.user_page"""
+    lo = bisect.bisect_left(keys, (date_from,)) if date_from else 0
+    hi = bisect.bisect_left(keys, (date_to,)) if date_to else len(keys)
+    if descending:
+        if after is not None:
+            hi = min(hi, bisect.bisect_left(keys, after))
+        return entries[max(lo, hi - limit):hi][::-1]
+    if after is not None:
+        lo = max(lo, bisect.bisect_right(keys, after))
+    return entries[lo:min(hi, lo + limit)]
+
+
+def _index_insert(index, key, booking):
+    """Add a booking to a copy of one (keys, bookings) list of an index"""
+    keys, entries = index.get(key, ([], []))
+    sort_key = booking_sort_key(booking)
+    position = bisect.bisect_right(keys, sort_key)
+    index[key] = (keys[:position] + [sort_key] + keys[position:],
+                  entries[:position] + [booking] + entries[position:])
+
+
+def _index_remove(index, key, booking):
+    """Remove a booking from a copy of one (keys, bookings) list of an index; False if it is not there"""
+    keys, entries = index.get(key, ([], []))
+    sort_key = booking_sort_key(booking)
+    position = bisect.bisect_left(keys, sort_key)
+    while position < len(keys) and keys[position] == sort_key:
+        if entries[position] is booking:
+            if len(keys) == 1:
+                del index[key]
+            else:
+                index[key] = (keys[:position] + keys[position + 1:], entries[:position] + entries[position + 1:])
+            return True
+        position += 1
+    return False
+
+
+class JsonBookingRepository:
+    """Bookings stored as a list in a JSON file.
+
+    Lookups by id, by user and by room use secondary indexes that are
+    rebuilt once per change of the file, or patched in place when the
+    change is one of this repository's own writes.
+    """
+
+    def __init__(self, path):
+        self.document = JsonDocument(path)
+        self._by_id = {}
+        self._by_user = {}
+        self._by_room = {}
+        self._indexed_version = None
+
+    @property
+    def version(self):
+        """Counter that changes whenever the stored bookings change"""
+        self.document.read()
+        return self.document.version
+
+    def all(self):
+        return self.document.load()
+
+    def count(self):
+        return len(self.document.read())
+
+    def max_id(self):
+        return max((b['id'] for b in self.document.read()), default=0)
+
+    def _indexes(self):
+        """Return (by_id, by_user, by_room), rebuilding them if the file changed.
+
+        by_user and by_room map to (keys, bookings) lists sorted by
+        booking_sort_key; by_room only holds confirmed bookings.
+        """
+        bookings = self.document.read()
+        with self.document._lock:
+            if self._indexed_version != self.document.version:
+                by_id = {}
+                by_user = {}
+                by_room = {}
+                for booking in sorted(bookings, key=booking_sort_key):
+                    # Older files can contain duplicate ids; keep the first one
+                    by_id.setdefault(booking['id'], booking)
+                    by_user.setdefault(str(booking.get('telegram_id')), []).append(booking)
+                    if booking.get('status') == 'confirmed':
+                        by_room.setdefault(booking['room_id'], []).append(booking)
+                self._by_id = by_id
+                self._by_user = {k: ([booking_sort_key(b) for b in v], v) for k, v in by_user.items()}
+                self._by_room = {k: ([booking_sort_key(b) for b in v], v) for k, v in by_room.items()}
+                self._indexed_version = self.document.version
+            return self._by_id, self._by_user, self._by_room
+
+    def _update_indexes(self, based_on_version, added=(), removed=()):
+        """Apply a saved write to the indexes instead of rebuilding them.
+
+        Only done if the indexes matched the data the write was based on;
+        otherwise the next lookup rebuilds them. Touched lists are replaced
+        rather than modified, so readers never see them half updated.
+        """
+        with self.document._lock:
+            if self._indexed_version != based_on_version:
+                return
+            for booking in removed:
+                if self._by_id.get(booking['id']) is booking:
+                    del self._by_id[booking['id']]
+                found = _index_remove(self._by_user, str(booking.get('telegram_id')), booking)
+                if booking.get('status') == 'confirmed':
+                    found = _index_remove(self._by_room, booking['room_id'], booking) and found
+                if not found:
+                    # The booking was changed after it was indexed; rebuild instead
+                    self._indexed_version = None
+                    return
+            for booking in added:
+                self._by_id.setdefault(booking['id'], booking)
+                _index_insert(self._by_user, str(booking.get('telegram_id')), booking)
+                if booking.get('status') == 'confirmed':
+                    _index_insert(self._by_room, booking['room_id'], booking)
+            self._indexed_version = self.document.version
+
+    def get(self, booking_id):
+        return self._indexes()[0].get(booking_id)
+
+    def user_page(self, telegram_id, after=None, limit=50, date_from=None, date_to=None, descending=False):
+        """One page of a user's bookings in booking_sort_key order.
+
+        `after` is the sort key of the last booking of the previous page;
+        date_from is inclusive and date_to exclusive. With descending=True
+        the page runs backwards from `after` (or from date_to).
+        """
+        keys, entries = self._indexes()[1].get(str(telegram_id), ([], []))
+        return _page_of(keys, entries, after, limit, date_from, date_to, descending)
+
+    def room_page(self, room_id, after=None, limit=50, date_from=None, date_to=None, descending=False):
+        """One page of a room's confirmed bookings; arguments as for user_page"""
+        keys, entries = self._indexes()[2].get(room_id, ([], []))
+        return _page_of(keys, entries, after, limit, date_from, date_to, descending)
+
+    def for_room_date(self, room_id, date, status='confirmed'):
+        if status != 'confirmed':
+            return [b for b in self.document.read()
+                    if b['room_id'] == room_id and b['date'] == date and b['status'] == status]
+        # by_room only holds confirmed bookings; date + '\0' is the next string after date
+        keys, entries = self._indexes()[2].get(room_id, ([], []))
+        return entries[bisect.bisect_left(keys, (date,)):bisect.bisect_left(keys, (date + '\0',))]
+
+    def for_user(self, telegram_id):
+        return list(self._indexes()[1].get(str(telegram_id), ([], []))[1])
+
+    def add(self, booking):
+        self.add_many([booking])
+
+    def write_lock(self):
+        """Hold the write lock so a read-check-write sequence is atomic"""
+        return self.document.locked()
+
+    def add_many(self, bookings):
+        with self.document.locked():
+            data = self.document.load()
+            version = self.document.version
+            data.extend(bookings)
+            self.document.save(data)
+            self._update_indexes(version, added=bookings)
+
+    def update(self, booking):
+        """Replace the stored booking with the same id; returns False if it is gone"""
+        with self.document.locked():
+            data = self.document.load()
+            version = self.document.version
+            for i, existing in enumerate(data):
+                if existing['id'] == booking['id']:
+                    data[i] = booking
+                    self.document.save(data)
+                    self._update_indexes(version, added=[booking], removed=[existing])
+                    return True
+        return False
+
+    def delete(self, booking_id):
+        """Delete a booking and return it, or None if it was not found"""
+        with self.document.locked():
+            data = self.document.load()
+            version = self.document.version
+            for i, existing in enumerate(data):
+                if existing['id'] == booking_id:
+                    deleted = data.pop(i)
+                    self.document.save(data)
+                    self._update_indexes(version, removed=[deleted])
+                    return deleted
+        return None
+
+    def delete_many(self, booking_ids):
+        """Delete all bookings with the given ids and return how many were removed"""
+        booking_ids = set(booking_ids)
+        with self.document.locked():
+            data = self.document.load()
+            remaining = [b for b in data if b['id'] not in booking_ids]
+            if len(remaining) != len(data):
+                self.document.save(remaining)
+        return len(data) - len(remaining)
+
+    def replace_all(self, bookings):
+        self.document.save(list(bookings))
+
+
+class SqliteBookingRepository:
+    """Bookings stored as rows of a SQLite database.
+
+    The columns used for lookups are stored separately and indexed; the full
+    booking record is kept as JSON in `data` so optional fields such as
+    `admin_reason` or `parent_booking_id` round-trip unchanged.
+
+    Every thread uses its own connection, so with WAL reads in one thread go
+    on while another holds the write lock. Each write transaction also
+    increments the counter in the meta table, which makes `version` the
+    same for every thread and process looking at the database.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY,
+            room_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            telegram_id TEXT,
+            status TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_bookings_room_date ON bookings (room_id, date);
+        CREATE INDEX IF NOT EXISTS idx_bookings_telegram_id ON bookings (telegram_id);
+        CREATE INDEX IF NOT EXISTS idx_bookings_user_order ON bookings (telegram_id, date, start_time, id);
+        CREATE INDEX IF NOT EXISTS idx_bookings_room_order ON bookings (room_id, status, date, start_time, id);
+        CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings (status);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta VALUES ('version', 0);
+    """
+
+    # Added to the version after a rollback, so nothing derived from the
+    # rolled back writes matches a later version
+    ROLLBACK_VERSION_STEP = 1 << 32
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._version_offset = 0
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # Autocommit mode; write methods open their own transactions
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @property
+    def _conn(self):
+        """Connection of the calling thread, opened on first use (and again after a fork)"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = self._connect()
+            local.pid = os.getpid()
+            local.in_transaction = False
+        return local.conn
+
+    @staticmethod
+    def _row_values(booking):
+        telegram_id = booking.get('telegram_id')
+        return (
+            booking['id'],
+            booking['room_id'],
+            booking['date'],
+            booking['start_time'],
+            booking['end_time'],
+            str(telegram_id) if telegram_id is not None else None,
+            booking.get('status', 'confirmed'),
+            json.dumps(booking, ensure_ascii=False),
+        )
+
+    def _query(self, sql, params=()):
+        return [json.loads(row['data']) for row in self._conn.execute(sql, params)]
+
+    @contextmanager
+    def write_lock(self):
+        """Hold the database write lock so a read-check-write sequence is atomic.
+
+        Write methods called inside join the open transaction, which is
+        committed when the outermost block exits.
+        """
+        conn = self._conn
+        if self._local.in_transaction:
+            yield
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.in_transaction = True
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            # Anything derived from the rolled back writes is now stale
+            self._version_offset += self.ROLLBACK_VERSION_STEP
+            raise
+        else:
+            conn.execute('COMMIT')
+        finally:
+            self._local.in_transaction = False
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements under the write lock and bump the version when they succeed"""
+        with self.write_lock():
+            conn = self._conn
+            yield conn
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    @property
+    def version(self):
+        """Counter that changes whenever the stored bookings change; each write adds one"""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] + self._version_offset
+
+    def all(self):
+        return self._query('SELECT data FROM bookings ORDER BY id')
+
+    def count(self):
+        return self._conn.execute('SELECT COUNT(*) FROM bookings').fetchone()[0]
+
+    def max_id(self):
+        return self._conn.execute('SELECT MAX(id) FROM bookings').fetchone()[0] or 0
+
+    def get(self, booking_id):
+        rows = self._query('SELECT data FROM bookings WHERE id = ?', (booking_id,))
+        return rows[0] if rows else None
+
+    def for_room_date(self, room_id, date, status='confirmed'):
+        return self._query(
+            'SELECT data FROM bookings WHERE room_id = ? AND date = ? AND status = ? ORDER BY start_time',
+            (room_id, date, status)
+        )
+
+    def for_user(self, telegram_id):
+        return self._query(
+            'SELECT data FROM bookings WHERE telegram_id = ? ORDER BY date, start_time',
+            (str(telegram_id),)
+        )
+
+    def _page(self, where, params, after, limit, date_from, date_to, descending):
+        conditions = [where]
+        params = list(params)
+        if date_from:
+            conditions.append('date >= ?')
+            params.append(date_from)
+        if date_to:
+            conditions.append('date < ?')
+            params.append(date_to)
+        if after is not None:
+            conditions.append(f"(date, start_time, id) {'<' if descending else '>'} (?, ?, ?)")
+            params.extend(after)
+        order = 'DESC' if descending else 'ASC'
+        params.append(limit)
+        return self._query(
+            f"SELECT data FROM bookings WHERE {' AND '.join(conditions)} "
+            f"ORDER BY date {order}, start_time {order}, id {order} LIMIT ?",
+            params
+        )
+
+    def user_page(self, telegram_id, after=None, limit=50, date_from=None, date_to=None, descending=False):
+        """One page of a user's bookings; see JsonBookingRepository.user_page"""
+        return self._page('telegram_id = ?', (str(telegram_id),), after, limit, date_from, date_to, descending)
+
+    def room_page(self, room_id, after=None, limit=50, date_from=None, date_to=None, descending=False):
+        """One page of a room's confirmed bookings"""
+        return self._page("room_id = ? AND status = 'confirmed'", (room_id,), after, limit, date_from, date_to, descending)
+
+    def add(self, booking):
+        self.add_many([booking])
+
+    def add_many(self, bookings):
+        with self._transaction() as conn:
+            conn.executemany('INSERT INTO bookings VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             [self._row_values(b) for b in bookings])
+
+    def update(self, booking):
+        """Replace the stored booking with the same id; returns False if it is gone"""
+        values = self._row_values(booking)
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                'UPDATE bookings SET room_id = ?, date = ?, start_time = ?, end_time = ?, '
+                'telegram_id = ?, status = ?, data = ? WHERE id = ?',
+                values[1:] + values[:1]
+            )
+            return cursor.rowcount > 0
+
+    def delete(self, booking_id):
+        """Delete a booking and return it, or None if it was not found"""
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data FROM bookings WHERE id = ?', (booking_id,)).fetchone()
+            if row is None:
+                return None
+            conn.execute('DELETE FROM bookings WHERE id = ?', (booking_id,))
+            return json.loads(row['data'])
+
+    def delete_many(self, booking_ids):
+        """Delete all bookings with the given ids and return how many were removed"""
+        with self._transaction() as conn:
+            cursor = conn.executemany('DELETE FROM bookings WHERE id = ?', [(i,) for i in booking_ids])
+            return cursor.rowcount
+
+    def replace_all(self, bookings):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM bookings')
+            conn.executemany('INSERT INTO bookings VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             [self._row_values(b) for b in bookings])
+
+
+def create_booking_repository(database_url=DATABASE_URL, json_path=BOOKINGS_JSON_PATH):
+    """Create the booking repository configured by DATABASE_URL.
+
+    sqlite:///path/to/file.db selects the SQLite backend; anything else keeps
+    bookings in the JSON file.
+    """
+    if database_url and database_url.startswith('sqlite:///'):
+        return SqliteBookingRepository(database_url[len('sqlite:///'):])
+    return JsonBookingRepository(json_path)
+
+
+def import_json_bookings(json_path, repository):
+    """Copy bookings from a JSON file into an empty repository.
+
+    Bookings that share an id (older versions allocated ids as len + 1) are
+    given fresh ids so they fit the primary key.
+    """
+    if repository.count():
+        raise ValueError("Target repository already contains bookings")
+
+    with open(json_path, 'r', encoding='utf-8') as f:
+        bookings = json.load(f)
+
+    seen_ids = set()
+    next_id = max((b['id'] for b in bookings), default=0) + 1
+    imported = []
+    for booking in bookings:
+        if booking['id'] in seen_ids:
+            logging.warning(f"Duplicate booking id {booking['id']} renumbered to {next_id}")
+            booking = dict(booking, id=next_id)
+            next_id += 1
+        seen_ids.add(booking['id'])
+        imported.append(booking)
+
+    repository.add_many(imported)
+    return len(imported)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import bookings from JSON into SQLite")
+    parser.add_argument('database_url', help="Target database, e.g. sqlite:///data/bookings.db")
+    parser.add_argument('--json', default=BOOKINGS_JSON_PATH, help="Source bookings JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    target = create_booking_repository(args.database_url)
+    if not isinstance(target, SqliteBookingRepository):
+        parser.error("database_url must start with sqlite:///")
+    count = import_json_bookings(args.json, target)
+    logging.info(f"Imported {count} bookings into {target.path}")
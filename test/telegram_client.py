@@ -0,0 +1,82 @@
+import time
+import threading
+from collections import defaultdict, deque
+import requests
+from requests.adapters import HTTPAdapter
+from config import BOT_TOKEN, TELEGRAM_API_URL, TELEGRAM_POOL_SIZE, TELEGRAM_TIMEOUT, TELEGRAM_CONNECT_TIMEOUT
+
+
+class TelegramClient:
+    """Bot API client that reuses pooled keep-alive connections.
+
+    All calls go through one requests.Session, so consecutive messages reuse
+    an open TLS connection to the API instead of doing a new handshake each
+    time. Latency is recorded per API method; see metrics().
+    """
+
+    LATENCY_SAMPLES = 500
+
+    def __init__(self, token, base_url=TELEGRAM_API_URL, pool_size=TELEGRAM_POOL_SIZE,
+                 timeout=TELEGRAM_TIMEOUT, connect_timeout=TELEGRAM_CONNECT_TIMEOUT):
+        self.base_url = f"{base_url.rstrip('/')}/bot{token}"
+        self.timeout = (connect_timeout, timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._metrics_lock = threading.Lock()
+        self._calls = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._latencies = defaultdict(lambda: deque(maxlen=self.LATENCY_SAMPLES))
+
+    def call(self, method, params=None):
+        """Call a Bot API method and return the decoded JSON response.
+
+        Network errors and timeouts are raised; API-level errors are returned
+        as Telegram reports them ({'ok': False, 'error_code': ...}).
+        """
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.post(f"{self.base_url}/{method}", json=params or {}, timeout=self.timeout)
+            result = response.json()
+            ok = result.get('ok', False)
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._metrics_lock:
+                self._calls[method] += 1
+                self._latencies[method].append(elapsed)
+                if not ok:
+                    self._errors[method] += 1
+
+    def send_message(self, chat_id, text, **options):
+        params = {'chat_id': chat_id, 'text': text}
+        params.update(options)
+        return self.call('sendMessage', params)
+
+    def get_chat_member(self, chat_id, user_id):
+        return self.call('getChatMember', {'chat_id': chat_id, 'user_id': user_id})
+
+    def metrics(self):
+        """Per-method call counts, error counts and latency percentiles in milliseconds"""
+        with self._metrics_lock:
+            snapshot = {method: (self._calls[method], self._errors[method], sorted(samples))
+                        for method, samples in self._latencies.items()}
+
+        metrics = {}
+        for method, (calls, errors, samples) in snapshot.items():
+            def percentile(p):
+                return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1)
+            metrics[method] = {
+                'calls': calls,
+                'errors': errors,
+                'p50_ms': percentile(0.50),
+                'p95_ms': percentile(0.95),
+                'max_ms': round(samples[-1] * 1000, 1),
+            }
+        return metrics
+
+
+# Shared client for the bot token; each process gets its own connection pool
+telegram_client = TelegramClient(BOT_TOKEN)
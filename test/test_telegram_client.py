@@ -0,0 +1,106 @@
+import json
+import time
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from telegram_client import TelegramClient
+
+
+class StubBotApiHandler(BaseHTTPRequestHandler):
+    """Minimal Bot API: sendMessage succeeds, slowMethod stalls, anything else is an API error"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])) or b'{}')
+        method = self.path.rsplit('/', 1)[1]
+        self.server.requests.append((method, self.client_address, body))
+
+        if method == 'slowMethod':
+            time.sleep(0.5)
+        if method == 'sendMessage':
+            payload = {'ok': True, 'result': {'message_id': len(self.server.requests), 'text': body.get('text')}}
+        else:
+            payload = {'ok': False, 'error_code': 400, 'description': 'Bad Request'}
+
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TelegramClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubBotApiHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = TelegramClient('123:TEST', base_url=f'http://127.0.0.1:{self.server.server_port}',
+                                     timeout=0.2, connect_timeout=0.2)
+
+    def tearDown(self):
+        self.client.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_send_message(self):
+        result = self.client.send_message(42, 'hello', parse_mode='HTML')
+
+        self.assertTrue(result['ok'])
+        self.assertEqual(result['result']['text'], 'hello')
+        method, _, body = self.server.requests[0]
+        self.assertEqual(method, 'sendMessage')
+        self.assertEqual(body, {'chat_id': 42, 'text': 'hello', 'parse_mode': 'HTML'})
+
+    def test_consecutive_calls_reuse_one_connection(self):
+        for i in range(5):
+            self.client.send_message(42, f'message {i}')
+
+        client_addresses = {address for _, address, _ in self.server.requests}
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(len(client_addresses), 1)
+
+    def test_slow_response_times_out(self):
+        with self.assertRaises(requests.Timeout):
+            self.client.call('slowMethod')
+
+        # The client is still usable afterwards
+        self.assertTrue(self.client.send_message(42, 'after timeout')['ok'])
+
+    def test_api_error_is_returned(self):
+        result = self.client.get_chat_member(-100, 42)
+
+        self.assertFalse(result['ok'])
+        self.assertEqual(result['error_code'], 400)
+
+    def test_metrics(self):
+        self.client.send_message(42, 'one')
+        self.client.send_message(42, 'two')
+        self.client.get_chat_member(-100, 42)
+        with self.assertRaises(requests.Timeout):
+            self.client.call('slowMethod')
+
+        metrics = self.client.metrics()
+        self.assertEqual(set(metrics), {'sendMessage', 'getChatMember', 'slowMethod'})
+        self.assertEqual((metrics['sendMessage']['calls'], metrics['sendMessage']['errors']), (2, 0))
+        self.assertEqual((metrics['getChatMember']['calls'], metrics['getChatMember']['errors']), (1, 1))
+        self.assertEqual((metrics['slowMethod']['calls'], metrics['slowMethod']['errors']), (1, 1))
+        self.assertGreaterEqual(metrics['slowMethod']['p50_ms'], 200)
+        for method_metrics in metrics.values():
+            self.assertLessEqual(method_metrics['p50_ms'], method_metrics['p95_ms'])
+            self.assertLessEqual(method_metrics['p95_ms'], method_metrics['max_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()
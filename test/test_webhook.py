@@ -0,0 +1,41 @@
+import unittest
+from telegram import Update
+from telegram.ext import Application, CommandHandler, PollAnswerHandler, TypeHandler
+from webhook import allowed_update_types
+
+
+async def noop(update, context):
+    pass
+
+
+class AllowedUpdateTypesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.application = Application.builder().token('123:TEST').build()
+
+    def test_bot_handlers(self):
+        from bot import add_handlers
+        add_handlers(self.application)
+
+        self.assertEqual(allowed_update_types(self.application), ['callback_query', 'inline_query', 'message'])
+
+    def test_catch_all_screen_adds_no_types(self):
+        self.application.add_handler(TypeHandler(Update, noop), group=-1)
+        self.application.add_handler(CommandHandler('start', noop))
+
+        self.assertEqual(allowed_update_types(self.application), ['message'])
+
+    def test_unknown_handler_allows_all_types(self):
+        self.application.add_handler(CommandHandler('start', noop))
+        self.application.add_handler(PollAnswerHandler(noop))
+
+        self.assertEqual(allowed_update_types(self.application), list(Update.ALL_TYPES))
+
+    def test_catch_all_handler_in_normal_group_allows_all_types(self):
+        self.application.add_handler(TypeHandler(Update, noop))
+
+        self.assertEqual(allowed_update_types(self.application), list(Update.ALL_TYPES))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,8 @@ TRANSLATIONS = {
         'rooms': 'Rooms',
         'available': 'Available',
         'occupied': 'Occupied',
+        'free_at': 'Free at',
+        'next_booking_at': 'Next booking at',
         'book_room': 'Book Room',
         'view_schedule': 'View Schedule',
         'back': 'Back',
@@ -64,6 +66,9 @@ TRANSLATIONS = {
         'back_to_rooms': 'Back',
         'today': 'Today',
         'past': 'Past',
+        'upcoming': 'Upcoming',
+        'load_more': 'Load more',
+        'too_many_requests': 'Too many requests, please try again later',
         'confirmed': 'Confirmed',
         'completed': 'Completed',
         'current_schedule': 'Current Schedule',
@@ -150,6 +155,27 @@ TRANSLATIONS = {
         'deleting_booking_for': 'Deleting booking for',
         'admin_only': 'Admin access required',
         'start_date': 'Start Date',
+        'active': 'Active',
+        'inactive': 'Inactive',
+        'admin_comment': 'Admin comment',
+        'admin_comment_help': 'This comment will be visible to all users in the schedule',
+        'admin_comment_placeholder': 'Administrative note (visible to all users)',
+        'created_at': 'Created',
+        'created_by': 'Created by',
+        'days': 'Days',
+        'hours': 'hours',
+        'interval': 'Interval',
+        'max_3_repeats': 'Maximum 3 repeats',
+        'notification_created': 'Notification created successfully',
+        'notification_deleted': 'Notification deleted successfully',
+        'notification_error': 'Notification error',
+        'remove': 'Remove',
+        'repeats': 'Repeats',
+        'time': 'Time',
+        'times': 'times',
+        'toggle_status': 'Toggle status',
+        'additional_rooms': 'Also book rooms',
+        'conflicting_dates': 'Dates not booked because of conflicts',
     },
     'ru': {
         'app_title': 'Sapa Group',
@@ -158,6 +184,8 @@ TRANSLATIONS = {
         'rooms': 'Переговорные',
         'available': 'Свободна',
         'occupied': 'Занята',
+        'free_at': 'Освободится в',
+        'next_booking_at': 'Следующая бронь в',
         'book_room': 'Забронировать',
         'view_schedule': 'Посмотреть расписание',
         'back': 'Назад',
@@ -214,6 +242,9 @@ TRANSLATIONS = {
         'back_to_rooms': 'Назад',
         'today': 'Сегодня',
         'past': 'Прошедшие',
+        'upcoming': 'Предстоящие',
+        'load_more': 'Показать ещё',
+        'too_many_requests': 'Слишком много запросов, попробуйте позже',
         'confirmed': 'Подтверждено',
         'completed': 'Завершено',
         'current_schedule': 'Текущее расписание',
@@ -306,7 +337,7 @@ TRANSLATIONS = {
         'start_date': 'Дата начала',
         'created_by': 'Создано',
         'active': 'Активно',
-        'inactive': 'Белсенді емес',
+        'inactive': 'Неактивно',
         'days': 'Дни',
         'time': 'Время',
         'repeats': 'Повторов',
@@ -319,6 +350,8 @@ TRANSLATIONS = {
         'notification_deleted': 'Уведомление успешно удалено',
         'notification_created': 'Уведомление успешно создано',
         'notification_error': 'Ошибка с уведомлением',
+        'additional_rooms': 'Также забронировать комнаты',
+        'conflicting_dates': 'Даты, не забронированные из-за пересечений',
     },
     'kk': {
         'app_title': 'Sapa Group',
@@ -327,6 +360,8 @@ TRANSLATIONS = {
         'rooms': 'Кеңесу бөлмелері',
         'available': 'Бос',
         'occupied': 'Алынған',
+        'free_at': 'Босайды:',
+        'next_booking_at': 'Келесі брондау:',
         'book_room': 'Брондау',
         'view_schedule': 'Кестені көру',
         'back': 'Артқа',
@@ -383,6 +418,9 @@ TRANSLATIONS = {
         'back_to_rooms': 'Артқа',
         'today': 'Бүгін',
         'past': 'Өткен',
+        'upcoming': 'Алдағы',
+        'load_more': 'Тағы көрсету',
+        'too_many_requests': 'Сұраулар тым көп, кейінірек қайталап көріңіз',
         'confirmed': 'Расталды',
         'completed': 'Аяқталды',
         'current_schedule': 'Ағымдағы кесте',
@@ -487,6 +525,9 @@ TRANSLATIONS = {
         'notification_deleted': 'Хабарландыру сәтті жойылды',
         'notification_created': 'Хабарландыру сәтті жасалды',
         'notification_error': 'Хабарландыру қатесі',
+        'booked_by': 'Брондаған',
+        'additional_rooms': 'Сондай-ақ бөлмелерді брондау',
+        'conflicting_dates': 'Қайшылықтарға байланысты брондалмаған күндер',
     }
 }
 
@@ -523,12 +564,68 @@ COMPANIES = [
     }
 ]
 
+DEFAULT_LANGUAGE = 'en'
+
+# Language used for keys a language has no translation for
+FALLBACK_LANGUAGES = {
+    'kk': 'ru',
+    'ru': 'en',
+}
+
+def _compile_catalog():
+    """Merge every language with its fallback chain into one flat table per language"""
+    catalog = {}
+    for lang in TRANSLATIONS:
+        chain = [lang]
+        while chain[-1] in FALLBACK_LANGUAGES and FALLBACK_LANGUAGES[chain[-1]] not in chain:
+            chain.append(FALLBACK_LANGUAGES[chain[-1]])
+        table = {}
+        for fallback in reversed(chain):
+            table.update(TRANSLATIONS[fallback])
+        catalog[lang] = table
+    return catalog
+
+def _make_translator(table):
+    def translate(key, default=None):
+        value = table.get(key)
+        return value if value is not None else (default or key)
+    return translate
+
+# Compiled once at import: one dict lookup per translated string
+CATALOG = _compile_catalog()
+TRANSLATORS = {lang: _make_translator(table) for lang, table in CATALOG.items()}
+
+def get_translator(lang):
+    """Get the translation function for a language, e.g. for the template context"""
+    return TRANSLATORS.get(lang) or TRANSLATORS[DEFAULT_LANGUAGE]
+
 def get_translation(lang, key, default=None):
     """Get translation for a key in specified language"""
-    if lang not in TRANSLATIONS:
-        lang = 'en'
-    return TRANSLATIONS[lang].get(key, default or key)
+    return get_translator(lang)(key, default)
+
+def find_missing_translations():
+    """Return {lang: [keys]} of keys some language defines but this one does not"""
+    all_keys = set().union(*TRANSLATIONS.values())
+    missing = {}
+    for lang, table in TRANSLATIONS.items():
+        keys = sorted(all_keys - table.keys())
+        if keys:
+            missing[lang] = keys
+    return missing
 
 def get_companies():
     """Get list of companies"""
-    return COMPANIES
\ No newline at end of file
+    return COMPANIES
+
+
+if __name__ == '__main__':
+    import sys
+
+    # Build-time check: exits with status 1 if any language lacks a key
+    missing = find_missing_translations()
+    for lang, keys in missing.items():
+        fallback = FALLBACK_LANGUAGES.get(lang, 'the key itself')
+        print(f"{lang}: {len(keys)} missing, falling back to {fallback}")
+        for key in keys:
+            print(f"  {key}")
+    sys.exit(1 if missing else 0)
@@ -0,0 +1,57 @@
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+def ordering_key(update):
+    """Updates with the same key are handled one after another: the user, or the chat when there is no user"""
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return ('user', update.effective_user.id)
+        if update.effective_chat is not None:
+            return ('chat', update.effective_chat.id)
+    return None
+
+
+class OrderedUpdateProcessor(BaseUpdateProcessor):
+    """Runs up to `max_concurrent_updates` handlers at once while keeping each user's updates in order.
+
+    Updates of one user (see ordering_key) wait for each other on a per-user
+    lock, so conversations such as adding an admin see their messages in
+    the order they were sent. An update only takes one of the worker slots
+    once it holds its user's lock: a user sending many updates at once waits
+    on their own lock without blocking other users.
+
+    PTB admits `max_waiting_updates` updates (running or waiting for their
+    user's lock) before it queues the rest; it defaults to eight per worker.
+    """
+
+    def __init__(self, max_concurrent_updates, max_waiting_updates=None):
+        super().__init__(max(max_concurrent_updates, max_waiting_updates or max_concurrent_updates * 8))
+        self._workers = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # key -> [lock, number of updates holding or waiting for it]
+        self._key_locks = {}
+
+    async def do_process_update(self, update, coroutine):
+        key = ordering_key(update)
+        if key is None:
+            async with self._workers:
+                await coroutine
+            return
+
+        entry = self._key_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._workers:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._key_locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
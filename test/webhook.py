@@ -0,0 +1,171 @@
+import json
+import hmac
+import signal
+import asyncio
+import logging
+import secrets
+from aiohttp import web
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, CommandHandler, ConversationHandler, InlineQueryHandler, MessageHandler, TypeHandler
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Update types delivered to each kind of handler we register
+HANDLER_UPDATE_TYPES = {
+    CommandHandler: (Update.MESSAGE,),
+    MessageHandler: (Update.MESSAGE,),
+    CallbackQueryHandler: (Update.CALLBACK_QUERY,),
+    InlineQueryHandler: (Update.INLINE_QUERY,),
+}
+
+
+def allowed_update_types(application):
+    """Update types the registered handlers can handle, so Telegram does not send the rest.
+
+    A catch-all TypeHandler(Update, ...) in a negative group only screens
+    the updates other handlers get (e.g. rate limiting), so it adds no types.
+    Falls back to every type when any other handler of an unknown kind is
+    registered.
+    """
+    types = set()
+    pending = [handler for group, handlers in application.handlers.items() for handler in handlers
+               if not (group < 0 and isinstance(handler, TypeHandler) and handler.type is Update)]
+    while pending:
+        handler = pending.pop()
+        if isinstance(handler, ConversationHandler):
+            pending.extend(handler.entry_points)
+            pending.extend(handler.fallbacks)
+            for state_handlers in handler.states.values():
+                pending.extend(state_handlers)
+            continue
+        for handler_type, update_types in HANDLER_UPDATE_TYPES.items():
+            if isinstance(handler, handler_type):
+                types.update(update_types)
+                break
+        else:
+            return list(Update.ALL_TYPES)
+    return sorted(types)
+
+
+class WebhookServer:
+    """Receives updates from Telegram over HTTP and feeds them to the application.
+
+    Requests without the secret token given to setWebhook are rejected, so
+    only Telegram can inject updates. Updates go to the application's update
+    queue; when that queue is bounded and full the request is answered with
+    503 and Telegram delivers the update again later, instead of the process
+    buffering without limit.
+    """
+
+    def __init__(self, application, path, secret_token, host='0.0.0.0', port=8443):
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.host = host
+        self.port = port
+        self.web_app = web.Application()
+        self.web_app.router.add_post(path, self.handle_update)
+        self._runner = None
+
+    async def handle_update(self, request):
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret_token.encode()):
+            logging.warning(f"Rejected webhook request from {request.remote}: bad secret token")
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            logging.error(f"Invalid webhook update: {e}")
+            return web.Response(status=400)
+
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            logging.warning(f"Update queue full, asking Telegram to resend update {update.update_id}")
+            return web.Response(status=503, headers={'Retry-After': '1'})
+        return web.Response()
+
+    async def start(self):
+        self._runner = web.AppRunner(self.web_app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logging.info(f"Webhook server listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve_webhook(application, url, path, secret_token, host='0.0.0.0', port=8443, max_connections=40):
+    """Run the application on webhook updates until SIGINT/SIGTERM.
+
+    Mirrors Application.run_polling: post_init, post_stop and post_shutdown
+    callbacks run at the same points. When `url` is empty the webhook is not
+    registered with Telegram, which is how recorded updates are replayed
+    against a local server.
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    server = WebhookServer(application, path, secret_token, host, port)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await server.start()
+        if url:
+            await application.bot.set_webhook(
+                url=url.rstrip('/') + path,
+                secret_token=secret_token,
+                allowed_updates=allowed_update_types(application),
+                max_connections=max_connections,
+            )
+        await stop_event.wait()
+    finally:
+        await server.stop()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def generate_secret_token():
+    """Random secret token in the character set setWebhook accepts"""
+    return secrets.token_urlsafe(32)
+
+
+async def replay_updates(path, url, secret_token):
+    """POST recorded updates, one JSON object per line, to a webhook server"""
+    import aiohttp
+
+    async with aiohttp.ClientSession(headers={SECRET_HEADER: secret_token}) as session:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                update = json.loads(line)
+                async with session.post(url, json=update) as response:
+                    logging.info(f"Update {update.get('update_id')}: HTTP {response.status}")
+
+
+if __name__ == '__main__':
+    import argparse
+    from config import WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET
+
+    parser = argparse.ArgumentParser(description="Replay recorded Telegram updates against the local webhook server")
+    parser.add_argument('updates', help="File with one update JSON object per line")
+    parser.add_argument('--url', default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument('--secret', default=WEBHOOK_SECRET)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(replay_updates(args.updates, args.url, args.secret))